@@ -1,14 +1,17 @@
 import os
 import secrets
+import base64
 import hashlib
+import hmac
 import time
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Tuple
+from collections import OrderedDict, defaultdict, namedtuple
+from typing import Optional, Dict, List, Tuple
 from functools import wraps
 import asyncio
+import orjson
 from fastapi import HTTPException, Request, status
 from fastapi.security import APIKeyHeader
-from .database import get_database
+from .database import get_database, _write_lock
 
 # API Key header configuration
 API_KEY_HEADER = APIKeyHeader(name="X-API-Key", auto_error=False)
@@ -20,39 +23,196 @@ RATE_LIMITS = {
     "day": {"limit": 500, "window": 86400}
 }
 
-# Concurrent request tracking
+# Fixed-field usage record returned by check_rate_limit; avoids building a
+# six-key dict with f-string keys on every request
+Usage = namedtuple("Usage", [
+    "used_minute", "used_hour", "used_day",
+    "limit_minute", "limit_hour", "limit_day"
+])
+
+# The limit headers never change at runtime, so stringify them once
+_LIMIT_HEADERS = {
+    "X-RateLimit-Limit-Minute": str(RATE_LIMITS["minute"]["limit"]),
+    "X-RateLimit-Limit-Hour": str(RATE_LIMITS["hour"]["limit"]),
+    "X-RateLimit-Limit-Day": str(RATE_LIMITS["day"]["limit"])
+}
+
+# In-memory cache of validated API keys, keyed by key_hash.
+# Entries expire after API_KEY_CACHE_TTL seconds so revoked keys
+# stop working within a bounded window without a DB hit per request.
+# Insertion order doubles as recency (hits are moved to the end), so the
+# cache evicts least-recently-used entries once it reaches the cap and a
+# key-probing flood can't grow it without bound.
+API_KEY_CACHE_TTL = 30
+API_KEY_CACHE_MAX_ENTRIES = 10_000
+_api_key_cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+
+# API key ids whose last_used_at still needs persisting. Collected here on
+# each validation and flushed in one batched UPDATE instead of one commit
+# per request.
+LAST_USED_FLUSH_INTERVAL = 5
+_dirty_keys = set()
+_dirty_keys_lock = asyncio.Lock()
+
+# In-memory approximate sliding windows per api_key_id. For each period we
+# keep [window_index, previous_count, current_count] and weight the previous
+# window by how much of the current one is left — constant memory per key
+# instead of one stored timestamp per request. rate_limit_logs is still
+# written for audit, but asynchronously via the background flusher.
+# Log timestamps are stored as integer epoch milliseconds so SQLite compares
+# them as 64-bit ints instead of ISO strings.
+_counters: Dict[int, Dict[str, list]] = defaultdict(dict)
+_pending_logs: List[Tuple[int, str, int]] = []
+
+# Keys that already hit a limit, mapped to the monotonic time their
+# block lapses. A client hammering past its limit gets its 429 from
+# this dict without re-running the window check (which with Redis
+# enabled would be a network round-trip per rejected request).
+BLOCK_SECONDS = 60
+_blocked: Dict[int, float] = {}
+
+# Hashes of all active API keys, loaded at startup and refreshed
+# periodically. Unknown keys are rejected without a DB round-trip so key
+# probing can't amplify into Turso traffic. None means the set hasn't
+# loaded yet, in which case the filter is skipped. (At this key count a
+# plain set is cheaper and exact where a Bloom filter would approximate.)
+KNOWN_HASHES_REFRESH_INTERVAL = 300
+_known_hashes: Optional[set] = None
+
+# Optional Redis backend for distributed rate limiting. When REDIS_URL is
+# set, the sliding window lives in a Redis sorted set per api_key so counts
+# are shared across instances; otherwise the in-memory window above is used.
+REDIS_URL = os.getenv("REDIS_URL")
+_redis = None
+
+def get_redis():
+    """Get the shared Redis client, or None when REDIS_URL is not configured"""
+    global _redis
+    if _redis is None and REDIS_URL:
+        import redis
+        _redis = redis.Redis.from_url(REDIS_URL)
+    return _redis
+
+# Concurrent request tracking. The event loop is single-threaded and these
+# methods never await between check and update, so the counter needs no lock.
 class ConcurrentRequestTracker:
     def __init__(self, max_concurrent: int = 5):
         self.max_concurrent = max_concurrent
         self.current_requests = 0
-        self.lock = asyncio.Lock()
 
-    async def acquire(self):
-        async with self.lock:
-            if self.current_requests >= self.max_concurrent:
-                return False
-            self.current_requests += 1
-            return True
+    def acquire(self):
+        if self.current_requests >= self.max_concurrent:
+            return False
+        self.current_requests += 1
+        return True
 
-    async def release(self):
-        async with self.lock:
-            self.current_requests = max(0, self.current_requests - 1)
+    def release(self):
+        self.current_requests = max(0, self.current_requests - 1)
 
 # Global concurrent request tracker
 concurrent_tracker = ConcurrentRequestTracker(max_concurrent=5)
 
+# Recurring statement text as module constants, same as app.database:
+# byte-identical SQL lets the driver's statement cache skip re-parsing
+_SQL_INSERT_KEY = """
+INSERT INTO api_keys (user_id, key_hash, name)
+VALUES (?, ?, ?)
+"""
+
+_SQL_ACTIVE_HASHES = "SELECT key_hash FROM api_keys WHERE is_active = 1"
+
+_SQL_USER_INFO = "SELECT email, name FROM users WHERE id = ?"
+
+_SQL_SET_KEY_HASH = "UPDATE api_keys SET key_hash = ? WHERE id = ?"
+
+_SQL_TOUCH_KEYS = """
+UPDATE api_keys
+SET last_used_at = CURRENT_TIMESTAMP
+WHERE id IN ({placeholders})
+"""
+
+_SQL_INSERT_LOGS = """
+INSERT INTO rate_limit_logs (api_key_id, endpoint, timestamp)
+VALUES (?, ?, ?)
+"""
+
+# Pre-aggregated per-minute request counts: one upserted row per
+# (key, minute) instead of one log row per request, so the restart
+# fallback sums at most window/60 rows per period instead of counting
+# every log row in the day window
+COUNTER_BUCKET_SECONDS = 60
+
+_SQL_UPSERT_COUNTERS = """
+INSERT INTO rate_limit_counters (api_key_id, bucket, count)
+VALUES (?, ?, ?)
+ON CONFLICT(api_key_id, bucket) DO UPDATE SET count = count + excluded.count
+"""
+
+_SQL_DELETE_OLD_COUNTERS = "DELETE FROM rate_limit_counters WHERE bucket < ?"
+
+# Deletes run in bounded batches so one huge purge can't hold the write
+# lock for seconds or balloon the journal with rewritten pages
+CLEANUP_BATCH_ROWS = 5000
+
+_SQL_DELETE_OLD_LOGS_BATCH = """
+DELETE FROM rate_limit_logs
+WHERE rowid IN (
+    SELECT rowid FROM rate_limit_logs
+    WHERE timestamp < ?
+    LIMIT ?
+)
+"""
+
+# Optional self-validating keys. When API_KEY_SECRET is set, newly
+# issued keys carry their own metadata as an HMAC-SHA256-signed payload
+# ("kkm2.<payload>.<signature>"), so validating one is a MAC check plus
+# a membership test against the active-hash set for revocation — no DB
+# row fetch at all. Legacy kkm_ keys keep working via the DB path.
+API_KEY_SECRET = os.getenv("API_KEY_SECRET")
+SIGNED_KEY_PREFIX = "kkm2."
+
 def generate_api_key() -> str:
     """Generate a secure API key"""
-    # Generate 32 bytes (256 bits) of random data
-    random_bytes = secrets.token_bytes(32)
-    # Create a readable API key format: prefix_randomhex
-    prefix = "kkm"
-    random_part = secrets.token_urlsafe(32)
-    return f"{prefix}_{random_part}"
+    # Readable API key format: prefix_randompart (256 bits of randomness)
+    return f"kkm_{secrets.token_urlsafe(32)}"
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64url_decode(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def make_signed_api_key(api_key_id: int, user_id: int, email: str, name: Optional[str]) -> str:
+    """Build a self-validating API key carrying its own metadata"""
+    payload = orjson.dumps(
+        {"kid": api_key_id, "uid": user_id, "email": email, "name": name}
+    )
+    signature = hmac.new(API_KEY_SECRET.encode(), payload, hashlib.sha256).digest()
+    return f"{SIGNED_KEY_PREFIX}{_b64url(payload)}.{_b64url(signature)}"
+
+def _verify_signed_api_key(api_key: str) -> Optional[Dict]:
+    """Verify a signed key's MAC and return its embedded metadata"""
+    try:
+        payload_b64, signature_b64 = api_key[len(SIGNED_KEY_PREFIX):].split(".", 1)
+        payload = _b64url_decode(payload_b64)
+        expected = hmac.new(API_KEY_SECRET.encode(), payload, hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _b64url_decode(signature_b64)):
+            return None
+        data = orjson.loads(payload)
+        return {
+            "api_key_id": data["kid"],
+            "user_id": data["uid"],
+            "email": data["email"],
+            "name": data["name"]
+        }
+    except (ValueError, KeyError):
+        return None
 
 def hash_api_key(api_key: str) -> str:
     """Hash an API key for secure storage"""
-    return hashlib.sha256(api_key.encode()).hexdigest()
+    # SHA-256 keeps existing stored hashes valid; usedforsecurity=False lets
+    # OpenSSL skip the FIPS provider indirection on the per-request path.
+    return hashlib.new("sha256", api_key.encode(), usedforsecurity=False).hexdigest()
 
 def create_api_key_for_user(user_id: int, key_name: Optional[str] = None) -> Dict[str, str]:
     """Create a new API key for a user"""
@@ -60,19 +220,39 @@ def create_api_key_for_user(user_id: int, key_name: Optional[str] = None) -> Dic
         conn = get_database()
         cursor = conn.cursor()
 
-        # Generate new API key
-        api_key = generate_api_key()
-        key_hash = hash_api_key(api_key)
-
-        # Insert into database
-        cursor.execute("""
-            INSERT INTO api_keys (user_id, key_hash, name)
-            VALUES (?, ?, ?)
-        """, [user_id, key_hash, key_name or "Default API Key"])
+        with _write_lock:
+            if API_KEY_SECRET:
+                # Signed key: the payload embeds the row id, so insert with a
+                # provisional hash to get the id, then stamp the real one.
+                # Issuance is a cold path — the extra statements don't matter.
+                cursor.execute(_SQL_USER_INFO, [user_id])
+                user_row = cursor.fetchone()
+                if not user_row:
+                    raise Exception(f"User {user_id} not found")
+
+                cursor.execute(_SQL_INSERT_KEY, [
+                    user_id, f"pending_{secrets.token_urlsafe(16)}", key_name or "Default API Key"
+                ])
+                api_key_id = cursor.lastrowid
+                api_key = make_signed_api_key(
+                    api_key_id, user_id, user_row[0], user_row[1]
+                )
+                key_hash = hash_api_key(api_key)
+                cursor.execute(_SQL_SET_KEY_HASH, [key_hash, api_key_id])
+            else:
+                # Generate new API key
+                api_key = generate_api_key()
+                key_hash = hash_api_key(api_key)
+
+                # Insert into database
+                cursor.execute(_SQL_INSERT_KEY, [user_id, key_hash, key_name or "Default API Key"])
+
+            conn.commit()
+            cursor.close()
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # New keys must pass the active-hash filter immediately
+        if _known_hashes is not None:
+            _known_hashes.add(key_hash)
 
         return {
             "api_key": api_key,
@@ -81,97 +261,290 @@ def create_api_key_for_user(user_id: int, key_name: Optional[str] = None) -> Dic
     except Exception as e:
         raise Exception(f"Error creating API key: {str(e)}")
 
-def validate_api_key(api_key: str) -> Optional[Dict]:
-    """Validate an API key and return associated information"""
+def _load_known_hashes() -> set:
+    """Fetch hashes of all active API keys (blocking; run in a thread)"""
+    conn = get_database()
+    cursor = conn.cursor()
+    cursor.execute(_SQL_ACTIVE_HASHES)
+    hashes = {row[0] for row in cursor.fetchall()}
+    cursor.close()
+    return hashes
+
+async def refresh_known_hashes():
+    """Reload the active key hash set from the database"""
+    global _known_hashes
     try:
-        conn = get_database()
-        cursor = conn.cursor()
-
-        key_hash = hash_api_key(api_key)
-
-        # Get API key information
-        cursor.execute("""
-            SELECT ak.id, ak.user_id, ak.is_active, u.email, u.name
-            FROM api_keys ak
-            JOIN users u ON ak.user_id = u.id
-            WHERE ak.key_hash = ? AND ak.is_active = 1
-        """, [key_hash])
-
-        result = cursor.fetchone()
-
-        if not result:
-            cursor.close()
-            conn.close()
+        _known_hashes = await asyncio.to_thread(_load_known_hashes)
+    except Exception as e:
+        print(f"Error loading active key hashes: {str(e)}")
+
+async def known_hashes_loop(interval: int = KNOWN_HASHES_REFRESH_INTERVAL):
+    """Background task that keeps the active key hash set fresh"""
+    while True:
+        await refresh_known_hashes()
+        await asyncio.sleep(interval)
+
+def invalidate_api_key(key_hash: str):
+    """Remove a key from the validation cache (call on deactivation/delete)"""
+    _api_key_cache.pop(key_hash, None)
+    if _known_hashes is not None:
+        _known_hashes.discard(key_hash)
+
+# Constant statement text so the driver's statement cache can reuse the
+# parsed query (the libsql binding has no explicit prepare() API)
+_SQL_VALIDATE_KEY = """
+SELECT ak.id, ak.user_id, ak.is_active, u.email, u.name
+FROM api_keys ak
+JOIN users u ON ak.user_id = u.id
+WHERE ak.key_hash = ? AND ak.is_active = 1
+"""
+
+def _validate_api_key_db(key_hash: str) -> Optional[Dict]:
+    """Look up an API key row in the database (blocking; run in a thread)"""
+    conn = get_database()
+    cursor = conn.cursor()
+
+    # Get API key information
+    cursor.execute(_SQL_VALIDATE_KEY, [key_hash])
+
+    result = cursor.fetchone()
+    cursor.close()
+
+    if not result:
+        return None
+
+    api_key_id, user_id, is_active, email, name = result
+
+    return {
+        "api_key_id": api_key_id,
+        "user_id": user_id,
+        "email": email,
+        "name": name
+    }
+
+async def validate_api_key(api_key: str, key_hash: Optional[str] = None) -> Optional[Dict]:
+    """Validate an API key and return associated information.
+
+    Callers that already computed the hash can pass it via key_hash to
+    avoid re-hashing on the hot path.
+    """
+    try:
+        # Self-validating keys never touch the DB: the MAC proves the
+        # metadata, and the periodically refreshed active-hash set
+        # handles revocation (a revoked key stops working within one
+        # refresh interval, same as a cached legacy key)
+        if API_KEY_SECRET and api_key.startswith(SIGNED_KEY_PREFIX):
+            api_key_info = _verify_signed_api_key(api_key)
+            if api_key_info is None:
+                return None
+            if _known_hashes is not None:
+                if key_hash is None:
+                    key_hash = hash_api_key(api_key)
+                if key_hash not in _known_hashes:
+                    return None
+            _dirty_keys.add(api_key_info["api_key_id"])
+            return api_key_info
+
+        if key_hash is None:
+            key_hash = hash_api_key(api_key)
+
+        # Serve repeat requests from the in-process cache
+        cached = _api_key_cache.get(key_hash)
+        if cached and time.time() - cached[0] < API_KEY_CACHE_TTL:
+            _api_key_cache.move_to_end(key_hash)
+            return cached[1]
+
+        # Keys not in the active-hash set can't validate: skip the DB
+        if _known_hashes is not None and key_hash not in _known_hashes:
             return None
 
-        api_key_id, user_id, is_active, email, name = result
+        # Run the blocking libsql call off the event loop so concurrent
+        # validations overlap their round-trips to Turso
+        api_key_info = await asyncio.to_thread(_validate_api_key_db, key_hash)
 
-        # Update last_used_at
-        cursor.execute("""
-            UPDATE api_keys
-            SET last_used_at = CURRENT_TIMESTAMP
-            WHERE id = ?
-        """, [api_key_id])
+        if not api_key_info:
+            return None
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+        # Mark last_used_at dirty; the background flusher persists it in batch
+        _dirty_keys.add(api_key_info["api_key_id"])
+        _api_key_cache[key_hash] = (time.time(), api_key_info)
+        _api_key_cache.move_to_end(key_hash)
+        while len(_api_key_cache) > API_KEY_CACHE_MAX_ENTRIES:
+            _api_key_cache.popitem(last=False)
 
-        return {
-            "api_key_id": api_key_id,
-            "user_id": user_id,
-            "email": email,
-            "name": name
-        }
+        return api_key_info
     except Exception as e:
         raise Exception(f"Error validating API key: {str(e)}")
 
-def check_rate_limit(api_key_id: int, endpoint: str) -> Tuple[bool, Dict[str, int]]:
-    """Check if request is within rate limits using sliding window algorithm"""
-    try:
-        conn = get_database()
+def _flush_writes_db(key_ids: List[int], rows: List[Tuple[int, str, int]]):
+    """Persist one flush batch (blocking; run in a thread)"""
+    conn = get_database()
+    with _write_lock:
         cursor = conn.cursor()
 
-        current_time = datetime.now()
-        usage = {}
-
-        for period, config in RATE_LIMITS.items():
-            window_start = current_time - timedelta(seconds=config["window"])
+        if key_ids:
+            placeholders = ",".join("?" * len(key_ids))
+            cursor.execute(
+                _SQL_TOUCH_KEYS.format(placeholders=placeholders), key_ids
+            )
 
-            # Count requests in the sliding window
-            cursor.execute("""
-                SELECT COUNT(*) FROM rate_limit_logs
-                WHERE api_key_id = ?
-                AND timestamp > ?
-                AND timestamp <= ?
-            """, [api_key_id, window_start.isoformat(), current_time.isoformat()])
-
-            count = cursor.fetchone()[0]
-            usage[f"used_{period}"] = count
-            usage[f"limit_{period}"] = config["limit"]
-
-            if count >= config["limit"]:
-                cursor.close()
-                conn.close()
-                return False, usage
-
-        # Log this request
-        cursor.execute("""
-            INSERT INTO rate_limit_logs (api_key_id, endpoint, timestamp)
-            VALUES (?, ?, ?)
-        """, [api_key_id, endpoint, current_time.isoformat()])
+        if rows:
+            cursor.executemany(_SQL_INSERT_LOGS, rows)
+
+            # Fold the same rows into per-minute counter buckets; the
+            # upsert makes this an O(1) increment per distinct
+            # (key, minute) rather than a row per request
+            buckets: Dict[Tuple[int, int], int] = defaultdict(int)
+            for row_key_id, _, ts_ms in rows:
+                buckets[(row_key_id, ts_ms // 1000 // COUNTER_BUCKET_SECONDS)] += 1
+            cursor.executemany(
+                _SQL_UPSERT_COUNTERS,
+                [(key_id, bucket, count) for (key_id, bucket), count in buckets.items()]
+            )
 
+        # One commit covers every statement above: a single remote round-trip
         conn.commit()
         cursor.close()
-        conn.close()
 
-        # Increment usage counts
-        for period in RATE_LIMITS:
-            usage[f"used_{period}"] += 1
+async def flush_pending_writes():
+    """Flush last_used_at updates and buffered log rows in one transaction"""
+    global _pending_logs
+
+    async with _dirty_keys_lock:
+        key_ids = list(_dirty_keys)
+        _dirty_keys.clear()
+    rows, _pending_logs = _pending_logs, []
 
-        return True, usage
+    if not key_ids and not rows:
+        return
+
+    try:
+        # The Turso round-trips run off the loop like every other DB
+        # call; only the buffer swap above happens on it
+        await asyncio.to_thread(_flush_writes_db, key_ids, rows)
     except Exception as e:
-        raise Exception(f"Error checking rate limit: {str(e)}")
+        print(f"Error flushing pending writes: {str(e)}")
+
+async def flush_writes_loop():
+    """Background task that flushes pending writes periodically"""
+    while True:
+        await asyncio.sleep(LAST_USED_FLUSH_INTERVAL)
+        await flush_pending_writes()
+
+def _check_rate_limit_redis(r, api_key_id: int) -> Tuple[bool, Usage]:
+    """Check rate limits against a Redis sorted set shared across instances"""
+    now = time.time()
+    key = f"rl:{api_key_id}"
+    day_window = RATE_LIMITS["day"]["window"]
+
+    # One pipeline round-trip: trim expired members, then count each window
+    pipe = r.pipeline()
+    pipe.zremrangebyscore(key, 0, now - day_window)
+    for config in RATE_LIMITS.values():
+        pipe.zcount(key, now - config["window"], "+inf")
+    counts = pipe.execute()[1:]
+
+    limits = [config["limit"] for config in RATE_LIMITS.values()]
+
+    if any(count >= limit for count, limit in zip(counts, limits)):
+        return False, Usage(*counts, *limits)
+
+    pipe = r.pipeline()
+    pipe.zadd(key, {str(time.time_ns()): now})
+    pipe.expire(key, day_window)
+    pipe.execute()
+
+    return True, Usage(*(count + 1 for count in counts), *limits)
+
+def _memory_usage(api_key_id: int, now: float) -> Tuple[list, list]:
+    """Roll the in-memory windows forward and read the weighted counts"""
+    counters = _counters[api_key_id]
+
+    used = []
+    limits = []
+
+    for period, config in RATE_LIMITS.items():
+        window = config["window"]
+        idx = int(now // window)
+
+        counter = counters.get(period)
+        if counter is None:
+            counter = counters[period] = [idx, 0, 0]
+        elif counter[0] != idx:
+            # Window rolled over: current becomes previous (or both reset
+            # if more than one full window has passed)
+            prev = counter[2] if counter[0] == idx - 1 else 0
+            counter[:] = [idx, prev, 0]
+
+        # Weight the previous window by the unelapsed fraction of this one
+        elapsed = (now % window) / window
+        used.append(int(counter[1] * (1 - elapsed)) + counter[2])
+        limits.append(config["limit"])
+
+    return used, limits
+
+def _redis_usage(r, api_key_id: int) -> Usage:
+    """Read the current window counts from Redis without recording anything"""
+    now = time.time()
+    key = f"rl:{api_key_id}"
+
+    pipe = r.pipeline()
+    for config in RATE_LIMITS.values():
+        pipe.zcount(key, now - config["window"], "+inf")
+    counts = pipe.execute()
+
+    return Usage(*counts, *(config["limit"] for config in RATE_LIMITS.values()))
+
+async def get_usage(api_key_id: int) -> Optional[Usage]:
+    """Current usage across all windows without counting a request.
+
+    Returns None when neither Redis nor the in-memory counters have seen
+    this key, so the caller can fall back to the audit log.
+    """
+    r = get_redis()
+    if r is not None:
+        try:
+            return await asyncio.to_thread(_redis_usage, r, api_key_id)
+        except Exception as e:
+            print(f"Redis usage read failed, using in-memory window: {str(e)}")
+
+    if api_key_id not in _counters:
+        return None
+
+    used, limits = _memory_usage(api_key_id, time.time())
+    return Usage(*used, *limits)
+
+async def check_rate_limit(api_key_id: int, endpoint: str) -> Tuple[bool, Usage]:
+    """Check if request is within rate limits using a sliding window"""
+    r = get_redis()
+    if r is not None:
+        try:
+            allowed, usage = await asyncio.to_thread(
+                _check_rate_limit_redis, r, api_key_id
+            )
+            # Only the live window lives in Redis; the audit log (and the
+            # counter buckets derived from it) is buffered either way
+            if allowed:
+                _pending_logs.append((api_key_id, endpoint, int(time.time() * 1000)))
+            return allowed, usage
+        except Exception as e:
+            # Fall back to the in-memory window if Redis is unreachable
+            print(f"Redis rate limit check failed, using in-memory window: {str(e)}")
+
+    now = time.time()
+    counters = _counters[api_key_id]
+    used, limits = _memory_usage(api_key_id, now)
+
+    if any(count >= limit for count, limit in zip(used, limits)):
+        return False, Usage(*used, *limits)
+
+    # Record the request in memory; the audit row is persisted in batch
+    for period in RATE_LIMITS:
+        counters[period][2] += 1
+
+    _pending_logs.append((api_key_id, endpoint, int(now * 1000)))
+
+    return True, Usage(*(count + 1 for count in used), *limits)
 
 async def rate_limit_middleware(request: Request, api_key: Optional[str] = None):
     """Middleware for rate limiting and authentication"""
@@ -182,16 +555,30 @@ async def rate_limit_middleware(request: Request, api_key: Optional[str] = None)
             detail="API key required"
         )
 
-    # Validate API key
-    api_key_info = validate_api_key(api_key)
+    # Validate API key (hash computed once and passed down)
+    key_hash = hash_api_key(api_key)
+    api_key_info = await validate_api_key(api_key, key_hash=key_hash)
     if not api_key_info:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid API key"
         )
 
+    # Serve repeat offenders from the block cache before any further work
+    api_key_id = api_key_info["api_key_id"]
+    unblock = _blocked.get(api_key_id)
+    if unblock is not None:
+        remaining = unblock - time.monotonic()
+        if remaining > 0:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers=_LIMIT_HEADERS | {"Retry-After": str(int(remaining) + 1)}
+            )
+        del _blocked[api_key_id]
+
     # Check concurrent request limit
-    if not await concurrent_tracker.acquire():
+    if not concurrent_tracker.acquire():
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Server overloaded. Maximum concurrent requests exceeded.",
@@ -199,47 +586,49 @@ async def rate_limit_middleware(request: Request, api_key: Optional[str] = None)
         )
 
     try:
-        # Check rate limits
-        endpoint = str(request.url.path)
-        within_limit, usage = check_rate_limit(api_key_info["api_key_id"], endpoint)
+        # Check rate limits; read the path straight from the scope so no
+        # URL object is assembled per request
+        endpoint = request.scope["path"]
+        within_limit, usage = await check_rate_limit(api_key_id, endpoint)
 
         if not within_limit:
+            # Remember the verdict so follow-up requests 429 immediately
+            _blocked[api_key_id] = time.monotonic() + BLOCK_SECONDS
+
             # Find which limit was exceeded
             exceeded_limits = []
-            for period in ["minute", "hour", "day"]:
-                if usage[f"used_{period}"] >= usage[f"limit_{period}"]:
-                    exceeded_limits.append(f"{usage[f'limit_{period}']} requests per {period}")
+            for period, used, limit in zip(("minute", "hour", "day"), usage[:3], usage[3:]):
+                if used >= limit:
+                    exceeded_limits.append(f"{limit} requests per {period}")
 
             raise HTTPException(
                 status_code=status.HTTP_429_TOO_MANY_REQUESTS,
                 detail=f"Rate limit exceeded: {', '.join(exceeded_limits)}",
-                headers={
-                    "X-RateLimit-Limit-Minute": str(usage["limit_minute"]),
-                    "X-RateLimit-Limit-Hour": str(usage["limit_hour"]),
-                    "X-RateLimit-Limit-Day": str(usage["limit_day"]),
-                    "X-RateLimit-Used-Minute": str(usage["used_minute"]),
-                    "X-RateLimit-Used-Hour": str(usage["used_hour"]),
-                    "X-RateLimit-Used-Day": str(usage["used_day"]),
+                headers=_LIMIT_HEADERS | {
+                    "X-RateLimit-Used-Minute": str(usage.used_minute),
+                    "X-RateLimit-Used-Hour": str(usage.used_hour),
+                    "X-RateLimit-Used-Day": str(usage.used_day),
                     "Retry-After": "60"
                 }
             )
 
-        # Add rate limit headers to response
-        request.state.rate_limit_headers = {
-            "X-RateLimit-Limit-Minute": str(usage["limit_minute"]),
-            "X-RateLimit-Limit-Hour": str(usage["limit_hour"]),
-            "X-RateLimit-Limit-Day": str(usage["limit_day"]),
-            "X-RateLimit-Remaining-Minute": str(usage["limit_minute"] - usage["used_minute"]),
-            "X-RateLimit-Remaining-Hour": str(usage["limit_hour"] - usage["used_hour"]),
-            "X-RateLimit-Remaining-Day": str(usage["limit_day"] - usage["used_day"])
+        # Write into the scope state dict directly; going through
+        # request.state builds a State wrapper per attribute set
+        state = request.scope.setdefault("state", {})
+
+        # Add rate limit headers to response; only the remaining counts vary
+        state["rate_limit_headers"] = _LIMIT_HEADERS | {
+            "X-RateLimit-Remaining-Minute": str(usage.limit_minute - usage.used_minute),
+            "X-RateLimit-Remaining-Hour": str(usage.limit_hour - usage.used_hour),
+            "X-RateLimit-Remaining-Day": str(usage.limit_day - usage.used_day)
         }
 
         # Store user info in request state for use in endpoints
-        request.state.user = api_key_info
+        state["user"] = api_key_info
 
     finally:
         # Always release the concurrent request slot
-        await concurrent_tracker.release()
+        concurrent_tracker.release()
 
 def cleanup_old_logs(days_to_keep: int = 7):
     """Clean up old rate limit logs to prevent database bloat"""
@@ -247,22 +636,47 @@ def cleanup_old_logs(days_to_keep: int = 7):
         conn = get_database()
         cursor = conn.cursor()
 
-        cutoff_date = datetime.now() - timedelta(days=days_to_keep)
-
-        cursor.execute("""
-            DELETE FROM rate_limit_logs
-            WHERE timestamp < ?
-        """, [cutoff_date.isoformat()])
+        cutoff_ms = int((time.time() - days_to_keep * 86400) * 1000)
+        deleted_count = 0
+
+        # Delete in batches, committing each one and releasing the write
+        # lock in between, so other writers slot in between batches
+        # instead of waiting for the whole purge
+        while True:
+            with _write_lock:
+                cursor.execute(
+                    _SQL_DELETE_OLD_LOGS_BATCH, [cutoff_ms, CLEANUP_BATCH_ROWS]
+                )
+                batch_deleted = cursor.rowcount
+                conn.commit()
+            deleted_count += max(batch_deleted, 0)
+            if batch_deleted < CLEANUP_BATCH_ROWS:
+                break
+
+        # The counters table holds at most ~1440 rows per key per day,
+        # so its purge doesn't need batching
+        with _write_lock:
+            cursor.execute(
+                _SQL_DELETE_OLD_COUNTERS, [cutoff_ms // 1000 // COUNTER_BUCKET_SECONDS]
+            )
+            conn.commit()
 
-        deleted_count = cursor.rowcount
-        conn.commit()
         cursor.close()
-        conn.close()
-
         return deleted_count
     except Exception as e:
         raise Exception(f"Error cleaning up logs: {str(e)}")
 
+async def cleanup_loop(interval: int = 3600):
+    """Background task that prunes old rate limit logs periodically"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            deleted_count = await asyncio.to_thread(cleanup_old_logs)
+            if deleted_count:
+                print(f"Cleaned up {deleted_count} old rate limit log entries")
+        except Exception as e:
+            print(f"Error during log cleanup: {str(e)}")
+
 # Helper function to create a test user and API key
 def create_test_user_and_key():
     """Create a test user and API key for development"""
@@ -274,18 +688,18 @@ def create_test_user_and_key():
         test_email = "test@example.com"
         test_password_hash = hash_api_key("test_password")  # In production, use proper password hashing
 
-        cursor.execute("""
-            INSERT OR IGNORE INTO users (email, password_hash, name)
-            VALUES (?, ?, ?)
-        """, [test_email, test_password_hash, "Test User"])
+        with _write_lock:
+            cursor.execute("""
+                INSERT OR IGNORE INTO users (email, password_hash, name)
+                VALUES (?, ?, ?)
+            """, [test_email, test_password_hash, "Test User"])
 
-        # Get user ID
-        cursor.execute("SELECT id FROM users WHERE email = ?", [test_email])
-        user_id = cursor.fetchone()[0]
+            # Get user ID
+            cursor.execute("SELECT id FROM users WHERE email = ?", [test_email])
+            user_id = cursor.fetchone()[0]
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+            conn.commit()
+            cursor.close()
 
         # Create API key for test user
         return create_api_key_for_user(user_id, "Test API Key")
@@ -1,4 +1,7 @@
 import os
+import threading
+import time
+from typing import NamedTuple, Optional
 import libsql
 from dotenv import load_dotenv
 
@@ -12,29 +15,174 @@ DATABASE_TOKEN = os.getenv("TURSO_DATABASE_TOKEN")
 if not DATABASE_URL or not DATABASE_TOKEN:
     raise ValueError("Missing Turso database credentials in .env file")
 
+# A single long-lived connection shared across requests. Opening a libsql
+# connection to Turso pays a TLS handshake, so it is done once lazily
+# instead of per call.
+_conn = None
+_conn_lock = threading.Lock()
+
+# Serializes write transactions on the shared connection. Writers run on
+# different executor threads (the log flusher, the hourly cleanup, key
+# creation, the startup migration); without this, a commit from one
+# thread mid-way through another's statements would persist a partial
+# batch. Read-only cursors don't take it.
+_write_lock = threading.Lock()
+
+# Hot-path SQL as module-level constants. The libsql binding exposes no
+# explicit prepare() API, but sending byte-identical statement text lets
+# the statement cache skip re-parsing on every call.
+_SQL_FOOD_BY_NAME = """
+SELECT f.id, f.name, f.serving, f.weight_g, f.calories_kcal, f.reference, c.name as category
+FROM foods f
+LEFT JOIN categories c ON f.category_id = c.id
+WHERE f.name LIKE ?
+"""
+
+_SQL_FOOD_BY_ID = """
+SELECT f.id, f.name, f.serving, f.weight_g, f.calories_kcal, f.reference, c.name as category
+FROM foods f
+LEFT JOIN categories c ON f.category_id = c.id
+WHERE f.id = ?
+"""
+
+_SQL_FOODS_PAGE_TOTAL = """
+SELECT f.id, f.name, f.serving, f.weight_g, f.calories_kcal, f.reference, c.name as category,
+       COUNT(*) OVER () AS total
+FROM foods f
+LEFT JOIN categories c ON f.category_id = c.id
+LIMIT ? OFFSET ?
+"""
+
+_SQL_TOTAL_FOODS = "SELECT COUNT(*) FROM foods"
+
+_SQL_STATS_COUNTS = """
+SELECT (SELECT COUNT(*) FROM foods) AS total_foods,
+       (SELECT COUNT(*) FROM categories) AS total_categories
+"""
+
+class FoodRow(NamedTuple):
+    """Row shape of the food queries; field order matches the SELECT columns"""
+    id: int
+    name: str
+    serving: Optional[str]
+    weight_g: Optional[float]
+    calories_kcal: Optional[float]
+    reference: Optional[str]
+    category: Optional[str]
+
+_SQL_ALL_CATEGORIES = "SELECT id, name FROM categories ORDER BY name"
+
+# Categories change at most with a deployment, so every caller shares one
+# memoized row list refreshed hourly
+CATEGORIES_TTL = 3600
+_categories_rows = None  # (fetched_at, rows)
+
+# The foods count moves rarely and only feeds display fields, so a short
+# memo spares the COUNT(*) scan on past-the-end page requests
+TOTAL_FOODS_TTL = 300
+_total_foods = None  # (fetched_at, count)
+
 def get_database():
-    """Get Turso database connection"""
+    """Get the shared Turso database connection"""
+    global _conn
+    if _conn is not None:
+        return _conn
+
     try:
-        # For remote-only connection to Turso
-        if DATABASE_URL and DATABASE_URL.startswith(("libsql://", "https://")):
-            # Use remote-only connection (no local replica)
-            conn = libsql.connect(DATABASE_URL, auth_token=DATABASE_TOKEN)
-            return conn
-        else:
-            raise ValueError("Invalid database URL format. Use libsql:// or https://")
+        with _conn_lock:
+            if _conn is None:
+                # For remote-only connection to Turso
+                if DATABASE_URL and DATABASE_URL.startswith(("libsql://", "https://")):
+                    # Use remote-only connection (no local replica)
+                    _conn = libsql.connect(DATABASE_URL, auth_token=DATABASE_TOKEN)
+                else:
+                    raise ValueError("Invalid database URL format. Use libsql:// or https://")
+        return _conn
     except Exception as e:
         raise Exception(f"Failed to connect to database: {str(e)}")
 
+def reset_connection():
+    """Drop the shared connection so the next call opens a fresh one"""
+    global _conn
+    with _conn_lock:
+        _conn = None
+
+def close_connection():
+    """Close the shared connection (shutdown hook)"""
+    global _conn
+    with _conn_lock:
+        if _conn is not None:
+            try:
+                _conn.close()
+            except Exception as e:
+                print(f"Error closing database connection: {str(e)}")
+            _conn = None
+
+def _execute(sql, params=None):
+    """Run a query on the shared connection, reconnecting once if it died.
+
+    Turso drops idle connections after a while; rather than paying a
+    pre-ping round-trip on every call, retry once on a fresh connection.
+    """
+    try:
+        cursor = get_database().cursor()
+        cursor.execute(sql, params or [])
+        return cursor
+    except Exception:
+        reset_connection()
+        cursor = get_database().cursor()
+        cursor.execute(sql, params or [])
+        return cursor
+
+def ensure_indexes():
+    """Create the indexes the hot-path queries rely on (idempotent)"""
+    try:
+        conn = get_database()
+        with _write_lock:
+            cursor = conn.cursor()
+            cursor.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_api_keys_key_hash
+                ON api_keys(key_hash)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_rate_limit_logs_api_key_timestamp
+                ON rate_limit_logs(api_key_id, timestamp)
+            """)
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_rate_limit_logs_timestamp
+                ON rate_limit_logs(timestamp)
+            """)
+            # Per-minute request counts, upserted by the log flusher; WITHOUT
+            # ROWID clusters rows on (api_key_id, bucket) so window sums are
+            # one contiguous range scan
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS rate_limit_counters (
+                    api_key_id INTEGER NOT NULL,
+                    bucket INTEGER NOT NULL,
+                    count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (api_key_id, bucket)
+                ) WITHOUT ROWID
+            """)
+            # Backfill legacy ISO-string timestamps to integer epoch milliseconds
+            cursor.execute("""
+                UPDATE rate_limit_logs
+                SET timestamp = CAST(strftime('%s', timestamp) AS INTEGER) * 1000
+                WHERE typeof(timestamp) = 'text'
+            """)
+            conn.commit()
+            cursor.close()
+        return True
+    except Exception as e:
+        print(f"Index migration failed: {str(e)}")
+        return False
+
 def test_connection():
     """Test if database connection works"""
     try:
-        conn = get_database()
         # Simple query to test connection
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1 as test")
+        cursor = _execute("SELECT 1 as test")
         cursor.fetchone()
         cursor.close()
-        conn.close()
         return True
     except Exception as e:
         print(f"Database connection failed: {str(e)}")
@@ -43,83 +191,106 @@ def test_connection():
 def get_food_by_name(name):
     """Search for foods by name"""
     try:
-        conn = get_database()
-        cursor = conn.cursor()
-        query = """
-        SELECT f.id, f.name, f.serving, f.weight_g, f.calories_kcal, f.reference, c.name as category
-        FROM foods f
-        LEFT JOIN categories c ON f.category_id = c.id
-        WHERE f.name LIKE ?
-        """
-        cursor.execute(query, [f"%{name}%"])
+        cursor = _execute(_SQL_FOOD_BY_NAME, [f"%{name}%"])
         results = cursor.fetchall()
         cursor.close()
-        conn.close()
-        return results
+        return [FoodRow._make(row) for row in results]
     except Exception as e:
         raise Exception(f"Error searching for food: {str(e)}")
 
 def get_food_by_id(food_id):
     """Get food by ID"""
     try:
-        conn = get_database()
-        cursor = conn.cursor()
-        query = """
-        SELECT f.id, f.name, f.serving, f.weight_g, f.calories_kcal, f.reference, c.name as category
-        FROM foods f
-        LEFT JOIN categories c ON f.category_id = c.id
-        WHERE f.id = ?
-        """
-        cursor.execute(query, [food_id])
+        cursor = _execute(_SQL_FOOD_BY_ID, [food_id])
         result = cursor.fetchone()
         cursor.close()
-        conn.close()
-        return result
+        return FoodRow._make(result) if result else None
     except Exception as e:
         raise Exception(f"Error getting food by ID: {str(e)}")
 
-def get_all_foods(limit=50, offset=0):
-    """Get all foods with pagination"""
+def get_foods_by_ids(food_ids):
+    """Fetch full rows for the given ids, preserving the ids' order"""
+    if not food_ids:
+        return []
     try:
-        conn = get_database()
-        cursor = conn.cursor()
-        query = """
-        SELECT f.id, f.name, f.serving, f.weight_g, f.calories_kcal, f.reference, c.name as category
-        FROM foods f
-        LEFT JOIN categories c ON f.category_id = c.id
-        LIMIT ? OFFSET ?
-        """
-        cursor.execute(query, [limit, offset])
+        placeholders = ",".join("?" * len(food_ids))
+        cursor = _execute(
+            f"""
+            SELECT f.id, f.name, f.serving, f.weight_g, f.calories_kcal, f.reference, c.name as category
+            FROM foods f
+            LEFT JOIN categories c ON f.category_id = c.id
+            WHERE f.id IN ({placeholders})
+            """,
+            list(food_ids)
+        )
         results = cursor.fetchall()
         cursor.close()
-        conn.close()
-        return results
+        by_id = {row[0]: FoodRow._make(row) for row in results}
+        return [by_id[food_id] for food_id in food_ids if food_id in by_id]
     except Exception as e:
-        raise Exception(f"Error getting foods: {str(e)}")
+        raise Exception(f"Error getting foods by ids: {str(e)}")
+
+def get_foods_page(limit=50, offset=0):
+    """Get one page of foods plus the total count in a single round-trip"""
+    try:
+        cursor = _execute(_SQL_FOODS_PAGE_TOTAL, [limit, offset])
+        results = cursor.fetchall()
+        cursor.close()
+
+        if not results:
+            # A page past the end returns no rows to carry the window total
+            return get_total_foods(), []
+
+        # The window total rides along in the last column of every row
+        return results[0][7], [FoodRow._make(row[:7]) for row in results]
+    except Exception as e:
+        raise Exception(f"Error getting foods page: {str(e)}")
 
 def get_total_foods():
     """Get total count of foods"""
+    global _total_foods
+    cached = _total_foods
+    if cached and time.time() - cached[0] < TOTAL_FOODS_TTL:
+        return cached[1]
+
     try:
-        conn = get_database()
-        cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM foods")
+        cursor = _execute(_SQL_TOTAL_FOODS)
         result = cursor.fetchone()
         count = result[0] if result else 0
         cursor.close()
-        conn.close()
+        _total_foods = (time.time(), count)
         return count
     except Exception as e:
         raise Exception(f"Error getting food count: {str(e)}")
 
+def get_stats_counts():
+    """Get the food and category counts in a single round-trip"""
+    try:
+        cursor = _execute(_SQL_STATS_COUNTS)
+        result = cursor.fetchone()
+        cursor.close()
+        return (result[0], result[1]) if result else (0, 0)
+    except Exception as e:
+        raise Exception(f"Error getting stats counts: {str(e)}")
+
+def reset_memos():
+    """Drop the module-level query memos (admin/test hook)"""
+    global _categories_rows, _total_foods
+    _categories_rows = None
+    _total_foods = None
+
 def get_all_categories():
     """Get all categories"""
+    global _categories_rows
+    cached = _categories_rows
+    if cached and time.time() - cached[0] < CATEGORIES_TTL:
+        return cached[1]
+
     try:
-        conn = get_database()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name FROM categories ORDER BY name")
+        cursor = _execute(_SQL_ALL_CATEGORIES)
         results = cursor.fetchall()
         cursor.close()
-        conn.close()
+        _categories_rows = (time.time(), results)
         return results
     except Exception as e:
         raise Exception(f"Error getting categories: {str(e)}")
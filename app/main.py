@@ -1,20 +1,35 @@
 from fastapi import FastAPI, HTTPException, Query, Depends, Request, Response
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.exceptions import HTTPException as StarletteHTTPException
 from pydantic import BaseModel
 
-from typing import Optional, List
+from typing import Annotated, Optional, List
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import gzip
+import hashlib
+import time
+import orjson
 import uvicorn
 import os
 
 from .database import (
     test_connection,
+    close_connection,
+    ensure_indexes,
     get_food_by_name,
     get_food_by_id,
-    get_all_foods,
-    get_total_foods,
-    get_all_categories
+    get_foods_by_ids,
+    get_foods_page,
+    get_stats_counts,
+    get_all_categories,
+    reset_memos
 )
+from . import search_index
 from .models import (
     HealthCheck,
     FoodWithCategory,
@@ -25,13 +40,21 @@ from .models import (
 from .auth import (
     create_api_key_for_user,
     create_test_user_and_key,
-    cleanup_old_logs
+    cleanup_old_logs,
+    cleanup_loop,
+    flush_writes_loop,
+    flush_pending_writes,
+    known_hashes_loop
 )
 from .rate_limit import (
     require_api_key,
-    get_rate_limit_status
+    get_rate_limit_status,
+    RateLimitHeadersMiddleware
 )
 
+# Resolved once at import; nothing request-scoped ever touches the filesystem
+_STATIC_DIR = os.path.join(os.path.dirname(__file__), "static")
+
 # Models for API key management
 class CreateUserRequest(BaseModel):
     email: str
@@ -48,7 +71,51 @@ app = FastAPI(
     description="Food calorie lookup API for Malaysian and international foods",
     version="1.0.0",
     docs_url="/docs",
-    redoc_url="/redoc"
+    redoc_url="/redoc",
+    default_response_class=ORJSONResponse
+)
+
+# Attach the X-RateLimit-* headers computed by require_api_key without
+# buffering responses through BaseHTTPMiddleware
+app.add_middleware(RateLimitHeadersMiddleware)
+
+# Compress sizable JSON bodies (big /foods pages, long search results);
+# responses under 1 KB fit a packet anyway, and the landing page and
+# static assets arrive precompressed so the middleware skips them
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves a sibling .gz file when the client accepts it.
+
+    Assets under app/static ship with precompressed copies, so gzip-capable
+    clients get them without per-request compression work; the GZip
+    middleware leaves responses alone once Content-Encoding is set.
+    """
+    async def get_response(self, path: str, scope):
+        if "gzip" in Headers(scope=scope).get("accept-encoding", ""):
+            try:
+                response = await super().get_response(path + ".gz", scope)
+            except StarletteHTTPException:
+                # StaticFiles raises Starlette's HTTPException (the parent
+                # of FastAPI's) on a missing .gz sibling
+                response = await super().get_response(path, scope)
+            else:
+                response.headers["Content-Encoding"] = "gzip"
+                response.headers["Vary"] = "Accept-Encoding"
+        else:
+            response = await super().get_response(path, scope)
+
+        # Asset filenames are versioned (landing.v1.css), so browsers can
+        # cache them for a day and never revalidate
+        response.headers["Cache-Control"] = "public, max-age=86400, immutable"
+        return response
+
+# Landing page assets (the CSS is versioned in its filename, so browsers
+# can cache it long-term and the HTML payload stays small)
+app.mount(
+    "/static",
+    PrecompressedStaticFiles(directory=_STATIC_DIR),
+    name="static"
 )
 
 # Add CORS middleware
@@ -56,219 +123,248 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allows all origins
     allow_credentials=True,
-    allow_methods=["*"],  # Allows all methods
-    allow_headers=["*"],  # Allows all headers
+    max_age=86400,  # Let browsers cache preflight results for a day
+    allow_methods=["GET", "POST"],  # The API only exposes these
+    allow_headers=["x-api-key", "content-type"],
 )
 
 
 
-@app.get("/", response_class=HTMLResponse)
-async def landing_page():
-    """Beautiful HTML landing page for the API"""
-    try:
-        # Get database statistics
-        db_connected = test_connection()
-        total_foods = get_total_foods() if db_connected else 0
-        categories = get_all_categories() if db_connected else []
-
-        # Sample food for demo
-        sample_food = None
-        if db_connected:
-            try:
-                sample_foods = get_food_by_name("nasi lemak")
-                sample_food = sample_foods[0] if sample_foods else None
-            except:
-                pass
+# FastAPI's built-in HTTPException handler still serializes with stdlib
+# json; routing it through orjson keeps the 401/404/429 paths on the same
+# fast encoder as everything else
+@app.exception_handler(HTTPException)
+async def http_exception_handler(request: Request, exc: HTTPException):
+    return ORJSONResponse(
+        {"detail": exc.detail},
+        status_code=exc.status_code,
+        headers=exc.headers
+    )
+
+# One handler for anything a route lets escape, instead of a try/except
+# wrapper repeated in every endpoint. HTTPExceptions never reach this:
+# FastAPI's own handler turns them into responses first.
+@app.exception_handler(Exception)
+async def unhandled_exception_handler(request: Request, exc: Exception):
+    return ORJSONResponse(
+        {"detail": f"Internal error: {exc}"},
+        status_code=500
+    )
 
-        status_color = "#22c55e" if db_connected else "#ef4444"
-        status_text = "🟢 Online" if db_connected else "🔴 Offline"
+# Short-lived response caches for the list endpoints. Categories are
+# essentially static and /foods pages repeat across clients, so both are
+# served from memory between refreshes instead of hitting Turso per call.
+CATEGORIES_CACHE_TTL = 300
+FOODS_CACHE_TTL = 60
+FOODS_CACHE_MAX_ENTRIES = 256
+_categories_cache = None  # (fetched_at, body bytes, etag)
+_foods_cache = {}  # (page, per_page) -> (fetched_at, body bytes, etag)
+
+# Negative cache for /foods/{id} misses. Probing non-existent IDs (scrapers,
+# scanners) otherwise costs a full Turso round-trip per 404; name searches
+# already get this for free because empty results sit in the search cache.
+NOT_FOUND_CACHE_TTL = 60
+NOT_FOUND_CACHE_MAX_ENTRIES = 4096
+_not_found_ids = {}  # food_id -> first_seen
+
+# Landing/stats figures served to the page's async fetch, cached so stats
+# requests aggregate across clients instead of each hitting Turso
+STATS_CACHE_TTL = 60
+_stats_cache = None  # (fetched_at, stats)
+
+# Health probes arrive frequently (load balancers, uptime monitors), so the
+# connectivity flag is cached for a few seconds. The lock makes sure only one
+# probe actually pings Turso when the flag expires under concurrent hits.
+HEALTH_CACHE_TTL = 5
+_last_health = (0.0, False)  # (checked_at, connected)
+_health_lock = asyncio.Lock()
+
+async def _db_healthy() -> bool:
+    """Return the cached database connectivity flag, refreshing if stale"""
+    global _last_health
+    checked_at, connected = _last_health
+    if time.monotonic() - checked_at < HEALTH_CACHE_TTL:
+        return connected
+
+    async with _health_lock:
+        # Another request may have refreshed while we waited for the lock
+        checked_at, connected = _last_health
+        if time.monotonic() - checked_at < HEALTH_CACHE_TTL:
+            return connected
+
+        connected = await asyncio.to_thread(test_connection)
+        _last_health = (time.monotonic(), connected)
+        return connected
+
+async def _health_probe_loop(interval: int = HEALTH_CACHE_TTL):
+    """Background task that keeps the connectivity flag fresh.
+
+    With the probe running, /health and /api/stats read a warm flag and
+    the DB sees a fixed probe rate regardless of incoming traffic; the
+    on-demand refresh in _db_healthy only covers probe gaps.
+    """
+    global _last_health
+    while True:
+        try:
+            connected = await asyncio.to_thread(test_connection)
+            _last_health = (time.monotonic(), connected)
+        except Exception as e:
+            print(f"Health probe failed: {str(e)}")
+        await asyncio.sleep(interval)
+
+def _serialize_etag(content):
+    """Encode content once and derive its ETag, for caching as a pair"""
+    body = orjson.dumps(content)
+    etag = f'W/"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+    return body, etag
+
+def _etag_response(request: Request, body: bytes, etag: str, max_age: int) -> Response:
+    """Answer with the serialized body, or 304 if the client already has it.
+
+    Lets browsers and any CDN in front of Render reuse list responses;
+    a matching If-None-Match costs the backend only the hash compare.
+    """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}, stale-while-revalidate=86400"
+    }
+
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    return Response(body, media_type="application/json", headers=headers)
+
+def _json_with_etag(request: Request, content, max_age: int) -> Response:
+    """Serialize content once, with cache headers and 304 revalidation"""
+    body, etag = _serialize_etag(content)
+    return _etag_response(request, body, etag, max_age)
+
+# Shared 404s raised on the hot paths: the id/name the client asked for
+# is already in the URL, so a fixed detail string keeps a miss (or a
+# 404-flood from a scanner) free of per-request exception construction
+_FOOD_NOT_FOUND = HTTPException(status_code=404, detail="Food not found")
+_NO_MATCHING_FOOD = HTTPException(status_code=404, detail="No matching food found")
+_SEARCH_TOO_SHORT = HTTPException(
+    status_code=422,
+    detail="Search query must be at least 2 characters"
+)
 
-        html_content = f"""
+def _food_dict(row):
+    """JSON-ready dict for a food row (same shape as FoodWithCategory)"""
+    food = row._asdict()
+    food["created_at"] = None  # not selected per row; kept for schema parity
+    return food
+
+# Pages above this size are stream-encoded row by row instead of being
+# buffered into one payload before the first byte leaves the server
+FOODS_STREAM_THRESHOLD = 50
+
+def _iter_foods_json(total, page, per_page, rows):
+    """Yield a FoodListResponse-shaped JSON body one encoded row at a time"""
+    yield b'{"total":%d,"page":%d,"per_page":%d,"foods":[' % (total, page, per_page)
+    sep = b""
+    for row in rows:
+        yield sep + orjson.dumps(_food_dict(row))
+        sep = b","
+    yield b"]}"
+
+# A handful of queries (the landing page examples) dominate search
+# traffic, so results are cached on the normalized name with a TTL. The
+# body is serialized once per miss and the bytes shared on hits, so
+# repeat searches skip the DB round-trip and the serialization both.
+SEARCH_CACHE_TTL = 300
+SEARCH_CACHE_MAX_ENTRIES = 2048
+_search_cache = {}  # name_norm -> (fetched_at, rows, body bytes)
+_search_inflight = {}  # name_norm -> task filling the cache for that name
+
+async def _search_foods_cached(name: str):
+    """Search foods by name, returning (rows, serialized body)"""
+    # casefold() matches how the index normalizes names; SQLite lower()
+    # would diverge on anything beyond ASCII
+    name_raw = name.strip()
+    name_norm = name_raw.casefold()
+
+    # Query length is re-checked after normalization: the Query validator
+    # sees the raw string, so whitespace padding could otherwise sneak a
+    # blank query past it (and a blank query matches every food)
+    if len(name_norm) < 2:
+        raise _SEARCH_TOO_SHORT
+
+    cached = _search_cache.get(name_norm)
+    if cached and time.time() - cached[0] < SEARCH_CACHE_TTL:
+        return cached[1], cached[2]
+
+    # Coalesce concurrent misses for the same name onto one lookup; the
+    # stragglers await the first request's task instead of re-querying
+    task = _search_inflight.get(name_norm)
+    if task is None:
+        task = asyncio.create_task(_search_foods_fresh(name_norm, name_raw))
+        _search_inflight[name_norm] = task
+        task.add_done_callback(lambda _: _search_inflight.pop(name_norm, None))
+    return await task
+
+async def _search_foods_fresh(name_norm: str, name_raw: str):
+    """Run one search miss and populate the cache"""
+    # Resolve matching ids against the in-memory trigram index and only
+    # ask Turso for those rows; until the index has loaded (or if it
+    # failed), fall back to the original LIKE scan. LIKE does its own
+    # ASCII-case-insensitive match, so it gets the un-casefolded query.
+    ids = search_index.lookup(name_norm)
+    if ids is None:
+        rows = tuple(await asyncio.to_thread(get_food_by_name, name_raw))
+    else:
+        rows = tuple(await asyncio.to_thread(get_foods_by_ids, ids))
+
+    # Serialize straight from the rows; response_model stays for the docs
+    body = orjson.dumps({
+        "total": len(rows),
+        "foods": list(map(_food_dict, rows))
+    })
+
+    # Keep the cache bounded; a full reset is fine at this size
+    if len(_search_cache) >= SEARCH_CACHE_MAX_ENTRIES:
+        _search_cache.clear()
+    _search_cache[name_norm] = (time.time(), rows, body)
+
+    return rows, body
+
+def reset_caches():
+    """Drop all in-process response caches (admin/test hook)"""
+    global _categories_cache, _stats_cache
+    _categories_cache = None
+    _stats_cache = None
+    _search_cache.clear()
+    _foods_cache.clear()
+    _not_found_ids.clear()
+    reset_memos()
+
+# Landing page markup. Nothing in it varies per request any more — the
+# stats are fetched client-side from /api/stats — so the handler serves
+# the same frozen bytes for the life of the process.
+_LANDING_HTML = """
         <!DOCTYPE html>
         <html lang="en">
         <head>
             <meta charset="UTF-8">
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
             <title>Kalori Makanan API 🍽️</title>
-            <style>
-                * {{ margin: 0; padding: 0; box-sizing: border-box; }}
-                body {{
-                    font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-                    line-height: 1.6;
-                    color: #2d3748;
-                    background: #f7fafc;
-                    min-height: 100vh;
-                }}
-                .container {{
-                    max-width: 1200px;
-                    margin: 0 auto;
-                    padding: 20px;
-                }}
-                .header {{
-                    background: white;
-                    border-radius: 12px;
-                    padding: 40px;
-                    margin-bottom: 30px;
-                    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.05);
-                    text-align: center;
-                    border: 1px solid #e2e8f0;
-                }}
-                .header h1 {{
-                    font-size: 2.5rem;
-                    color: #1a202c;
-                    margin-bottom: 12px;
-                    font-weight: 700;
-                }}
-                .header p {{
-                    font-size: 1.1rem;
-                    color: #718096;
-                    margin-bottom: 24px;
-                }}
-                .status {{
-                    display: inline-block;
-                    background: {status_color};
-                    color: white;
-                    padding: 8px 16px;
-                    border-radius: 6px;
-                    font-weight: 600;
-                    font-size: 0.9rem;
-                }}
-                .stats {{
-                    display: grid;
-                    grid-template-columns: repeat(auto-fit, minmax(200px, 1fr));
-                    gap: 20px;
-                    margin: 30px 0;
-                }}
-                .stat-card {{
-                    background: #f7fafc;
-                    padding: 24px;
-                    border-radius: 8px;
-                    text-align: center;
-                    border: 1px solid #e2e8f0;
-                    transition: transform 0.2s ease;
-                }}
-                .stat-card:hover {{
-                    transform: translateY(-2px);
-                    box-shadow: 0 4px 12px rgba(0, 0, 0, 0.1);
-                }}
-                .stat-number {{
-                    font-size: 2rem;
-                    font-weight: 700;
-                    color: #4299e1;
-                    margin-bottom: 4px;
-                }}
-                .section {{
-                    background: white;
-                    border-radius: 12px;
-                    padding: 32px;
-                    margin-bottom: 24px;
-                    box-shadow: 0 4px 6px rgba(0, 0, 0, 0.05);
-                    border: 1px solid #e2e8f0;
-                }}
-                .section h2 {{
-                    color: #1a202c;
-                    margin-bottom: 20px;
-                    font-size: 1.5rem;
-                    font-weight: 600;
-                }}
-                .example-grid {{
-                    display: grid;
-                    grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
-                    gap: 20px;
-                }}
-                .example-card {{
-                    background: #f7fafc;
-                    padding: 20px;
-                    border-radius: 8px;
-                    border: 1px solid #e2e8f0;
-                }}
-                .example-card h3 {{
-                    color: #2d3748;
-                    margin-bottom: 12px;
-                    font-weight: 600;
-                }}
-                .api-link {{
-                    color: #4299e1;
-                    text-decoration: none;
-                    font-family: 'Monaco', 'Menlo', monospace;
-                    background: #edf2f7;
-                    padding: 8px 12px;
-                    border-radius: 4px;
-                    display: inline-block;
-                    margin: 4px 0;
-                    font-size: 0.9rem;
-                    transition: all 0.2s ease;
-                }}
-                .api-link:hover {{
-                    background: #4299e1;
-                    color: white;
-                }}
-                .btn {{
-                    display: inline-block;
-                    background: #4299e1;
-                    color: white;
-                    padding: 12px 24px;
-                    border-radius: 6px;
-                    text-decoration: none;
-                    font-weight: 600;
-                    margin: 8px 8px 8px 0;
-                    transition: all 0.2s ease;
-                }}
-                .btn:hover {{
-                    background: #3182ce;
-                    transform: translateY(-1px);
-                }}
-                .btn-secondary {{
-                    background: #48bb78;
-                }}
-                .btn-secondary:hover {{
-                    background: #38a169;
-                }}
-                .code {{
-                    background: #2d3748;
-                    color: #e2e8f0;
-                    padding: 16px;
-                    border-radius: 6px;
-                    font-family: 'Monaco', 'Menlo', monospace;
-                    font-size: 0.9rem;
-                    overflow-x: auto;
-                    margin: 12px 0;
-                }}
-                .highlight {{
-                    background: #fef5e7;
-                    border-left: 4px solid #f6ad55;
-                    padding: 16px;
-                    border-radius: 0 6px 6px 0;
-                    margin: 16px 0;
-                }}
-                .footer {{
-                    text-align: center;
-                    padding: 24px;
-                    color: #718096;
-                }}
-                @media (max-width: 768px) {{
-                    .container {{ padding: 16px; }}
-                    .header {{ padding: 24px; }}
-                    .header h1 {{ font-size: 2rem; }}
-                    .stats {{ grid-template-columns: 1fr; }}
-                    .example-grid {{ grid-template-columns: 1fr; }}
-                }}
-            </style>
+            <link rel="stylesheet" href="/static/landing.v1.css">
+            <style>.status { background: #a0aec0; }</style>
         </head>
         <body>
             <div class="container">
                 <div class="header">
                     <h1>🍽️ Kalori Makanan API</h1>
                     <p>Fast & reliable food calorie lookup for Malaysian and international cuisine</p>
-                    <span class="status">{status_text}</span>
+                    <span class="status">⏳ Checking…</span>
 
                     <div class="stats">
                         <div class="stat-card">
-                            <div class="stat-number">{total_foods}+</div>
+                            <div class="stat-number"><span data-stat="total">—</span>+</div>
                             <div>Food Items</div>
                         </div>
                         <div class="stat-card">
-                            <div class="stat-number">{len(categories)}</div>
+                            <div class="stat-number"><span data-stat="categories">—</span></div>
                             <div>Categories</div>
                         </div>
                         <div class="stat-card">
@@ -327,10 +423,10 @@ async def landing_page():
                     <div class="code">
 GET /foods/search?name=nasi%20lemak
 
-{{
+{
   "total": 5,
   "foods": [
-    {{
+    {
       "id": 1,
       "name": "Nasi lemak (biasa)",
       "serving": "1 set",
@@ -338,9 +434,9 @@ GET /foods/search?name=nasi%20lemak
       "calories_kcal": 320.0,
       "category": "NASI, MEE, BIHUN,KUETIAU DAN LAIN- LAIN",
       "reference": "nutrition database"
-    }}
+    }
   ]
-}}
+}
                     </div>
                 </div>
 
@@ -378,93 +474,130 @@ data = r.json()</div>
             <div class="footer">
                 <p>Made with ❤️ for the Malaysian food community | Powered by FastAPI & Turso</p>
             </div>
+        <script>
+            fetch('/api/stats')
+                .then(function (res) { return res.json(); })
+                .then(function (stats) {
+                    document.querySelector('[data-stat="total"]').textContent = stats.total_foods;
+                    document.querySelector('[data-stat="categories"]').textContent = stats.categories;
+                    var status = document.querySelector('.status');
+                    if (stats.status === 'online') {
+                        status.textContent = '🟢 Online';
+                        status.style.background = '#22c55e';
+                    } else {
+                        status.textContent = '🔴 Offline';
+                        status.style.background = '#ef4444';
+                    }
+                })
+                .catch(function () {});
+        </script>
         </body>
         </html>
         """
 
-        return html_content
+# The page itself no longer varies between deploys, so its bytes and ETag
+# are fixed at import; browsers cache it and revalidate with a cheap 304
+LANDING_CACHE_TTL = 60
+_LANDING_BODY = _LANDING_HTML.encode()
+_LANDING_GZIP_BODY = gzip.compress(_LANDING_BODY, compresslevel=9)
+_LANDING_ETAG = f'W/"{hashlib.md5(_LANDING_BODY).hexdigest()}"'
+
+# Brotli shaves another ~15% off the gzip size; optional (and deliberately
+# not in requirements.txt) because the wheel is not available on every
+# platform we deploy to — install brotli==1.1.0 where it is
+try:
+    import brotli
+    _LANDING_BR_BODY = brotli.compress(_LANDING_BODY, quality=11)
+except ImportError:
+    _LANDING_BR_BODY = None
+
+_LANDING_HEADERS = {
+    "ETag": _LANDING_ETAG,
+    "Cache-Control": f"public, max-age={LANDING_CACHE_TTL}",
+    "Vary": "Accept-Encoding"
+}
+
+_LANDING_GZIP_HEADERS = {**_LANDING_HEADERS, "Content-Encoding": "gzip"}
+_LANDING_BR_HEADERS = {**_LANDING_HEADERS, "Content-Encoding": "br"}
 
-    except Exception as e:
-        # Fallback simple HTML if there's an error
-        return f"""
-        <!DOCTYPE html>
-        <html>
-        <head><title>Kalori Makanan API</title></head>
-        <body>
-            <h1>🍽️ Kalori Makanan API</h1>
-            <p>Food calorie lookup API</p>
-            <p><a href="/docs">API Documentation</a></p>
-            <p>Error loading full page: {str(e)}</p>
-        </body>
-        </html>
-        """
+@app.get("/", response_class=HTMLResponse)
+async def landing_page(request: Request):
+    """Beautiful HTML landing page for the API"""
+    # Let browsers revalidate with a cheap 304 instead of a full body;
+    # the 304 repeats the caching headers so the stored response's
+    # lifetime is refreshed
+    if request.headers.get("if-none-match") == _LANDING_ETAG:
+        return Response(status_code=304, headers=_LANDING_HEADERS)
+
+    # Serve bytes compressed once at import; the gzip middleware sees
+    # Content-Encoding already set and passes them through untouched
+    accept_encoding = request.headers.get("accept-encoding", "")
+    if _LANDING_BR_BODY is not None and "br" in accept_encoding:
+        return HTMLResponse(_LANDING_BR_BODY, headers=_LANDING_BR_HEADERS)
+    if "gzip" in accept_encoding:
+        return HTMLResponse(_LANDING_GZIP_BODY, headers=_LANDING_GZIP_HEADERS)
+
+    return HTMLResponse(_LANDING_BODY, headers=_LANDING_HEADERS)
+
+# The health endpoint only ever says one of two things; build both
+# responses once instead of re-validating a model per probe
+_HEALTHY = HealthCheck(
+    status="healthy",
+    message="API is running and database is connected",
+    database_connected=True
+)
+_UNHEALTHY = HealthCheck(
+    status="unhealthy",
+    message="API is running but database connection failed",
+    database_connected=False
+)
 
 @app.get("/health", response_model=HealthCheck)
 async def health_check():
     """Health check endpoint to verify API and database connectivity"""
-    try:
-        db_connected = test_connection()
-        if db_connected:
-            return HealthCheck(
-                status="healthy",
-                message="API is running and database is connected",
-                database_connected=True
-            )
-        else:
-            return HealthCheck(
-                status="unhealthy",
-                message="API is running but database connection failed",
-                database_connected=False
-            )
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Health check failed: {str(e)}"
-        )
+    return _HEALTHY if await _db_healthy() else _UNHEALTHY
+
+@app.get("/api/stats")
+async def get_stats():
+    """Database statistics shown on the landing page"""
+    global _stats_cache
+    cached = _stats_cache
+    if cached and time.time() - cached[0] < STATS_CACHE_TTL:
+        return cached[1]
+
+    if await _db_healthy():
+        try:
+            total_foods, num_cats = await asyncio.to_thread(get_stats_counts)
+            stats = {
+                "total_foods": total_foods,
+                "categories": num_cats,
+                "status": "online"
+            }
+        except Exception:
+            # The probe said healthy but the query still failed; report
+            # the page's offline state rather than a 500
+            stats = {"total_foods": 0, "categories": 0, "status": "offline"}
+    else:
+        stats = {"total_foods": 0, "categories": 0, "status": "offline"}
+
+    _stats_cache = (time.time(), stats)
+    return stats
 
 @app.get("/foods/search", response_model=FoodSearchResponse)
 async def search_foods(
     request: Request,
     response: Response,
-    name: str = Query(..., description="Food name to search for", example="nasi lemak"),
+    name: Annotated[str, Query(
+        min_length=2,
+        max_length=100,
+        description="Food name to search for",
+        example="nasi lemak"
+    )],
     auth=Depends(require_api_key)
 ):
     """Search for foods by name - Main feature for calorie lookup"""
-    try:
-        if not name or len(name.strip()) < 2:
-            raise HTTPException(
-                status_code=400,
-                detail="Search term must be at least 2 characters long"
-            )
-
-        results = get_food_by_name(name.strip())
-
-        foods = []
-        for row in results:
-            # row format: id, name, serving, weight_g, calories_kcal, reference, category
-            food = FoodWithCategory(
-                id=row[0],
-                name=row[1],
-                serving=row[2],
-                weight_g=row[3],
-                calories_kcal=row[4],
-                reference=row[5],
-                category=row[6]
-            )
-            foods.append(food)
-
-        return FoodSearchResponse(
-            total=len(foods),
-            foods=foods
-        )
-
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error searching for foods: {str(e)}"
-        )
+    _, body = await _search_foods_cached(name)
+    return Response(body, media_type="application/json")
 
 @app.get("/foods/{food_id}", response_model=FoodWithCategory)
 async def get_food_detail(
@@ -474,79 +607,68 @@ async def get_food_detail(
     auth=Depends(require_api_key)
 ):
     """Get detailed information about a specific food by its ID"""
-    try:
-        result = get_food_by_id(food_id)
-
-        if not result:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Food with ID {food_id} not found"
-            )
-
-        # result format: id, name, serving, weight_g, calories_kcal, reference, category
-        food = FoodWithCategory(
-            id=result[0],
-            name=result[1],
-            serving=result[2],
-            weight_g=result[3],
-            calories_kcal=result[4],
-            reference=result[5],
-            category=result[6]
-        )
+    # Serve repeat misses from the negative cache without touching the DB
+    seen = _not_found_ids.get(food_id)
+    if seen and time.time() - seen < NOT_FOUND_CACHE_TTL:
+        raise _FOOD_NOT_FOUND
 
-        return food
+    result = await asyncio.to_thread(get_food_by_id, food_id)
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error retrieving food details: {str(e)}"
-        )
+    if not result:
+        if len(_not_found_ids) >= NOT_FOUND_CACHE_MAX_ENTRIES:
+            _not_found_ids.clear()
+        _not_found_ids[food_id] = time.time()
+        raise _FOOD_NOT_FOUND
+
+    return _json_with_etag(request, _food_dict(result), max_age=3600)
 
 @app.get("/foods", response_model=FoodListResponse)
 async def list_foods(
     request: Request,
     response: Response,
-    page: int = Query(1, ge=1, description="Page number"),
-    per_page: int = Query(20, ge=1, le=100, description="Items per page"),
+    page: Annotated[int, Query(ge=1, description="Page number")] = 1,
+    per_page: Annotated[int, Query(ge=1, le=100, description="Items per page")] = 20,
     auth=Depends(require_api_key)
 ):
     """Get paginated list of all foods"""
-    try:
-        # Calculate offset
-        offset = (page - 1) * per_page
-
-        # Get total count and foods
-        total_foods = get_total_foods()
-        results = get_all_foods(limit=per_page, offset=offset)
-
-        foods = []
-        for row in results:
-            # row format: id, name, serving, weight_g, calories_kcal, reference, category
-            food = FoodWithCategory(
-                id=row[0],
-                name=row[1],
-                serving=row[2],
-                weight_g=row[3],
-                calories_kcal=row[4],
-                reference=row[5],
-                category=row[6]
-            )
-            foods.append(food)
-
-        return FoodListResponse(
-            total=total_foods,
-            page=page,
-            per_page=per_page,
-            foods=foods
+    # Serve repeated pages from the short-lived in-process cache
+    cache_key = (page, per_page)
+    cached = _foods_cache.get(cache_key)
+    if cached and time.time() - cached[0] < FOODS_CACHE_TTL:
+        return _etag_response(request, cached[1], cached[2], max_age=3600)
+
+    # Calculate offset
+    offset = (page - 1) * per_page
+
+    # One round-trip to Turso: the page query carries the total count
+    # along in a window-function column
+    total_foods, results = await asyncio.to_thread(get_foods_page, per_page, offset)
+
+    # Large pages are streamed row by row instead of buffered whole, so
+    # the first bytes go out while the tail is still being encoded
+    if per_page > FOODS_STREAM_THRESHOLD:
+        return StreamingResponse(
+            _iter_foods_json(total_foods, page, per_page, results),
+            media_type="application/json"
         )
 
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error retrieving foods list: {str(e)}"
-        )
+    # Plain dicts straight from the rows: the response bypasses model
+    # construction and dumping entirely, response_model stays for the docs
+    payload = {
+        "total": total_foods,
+        "page": page,
+        "per_page": per_page,
+        "foods": list(map(_food_dict, results))
+    }
+
+    # Cache the serialized bytes and ETag so hits skip re-encoding too;
+    # keep the page cache bounded, a full reset is fine at this size
+    body, etag = _serialize_etag(payload)
+    if len(_foods_cache) >= FOODS_CACHE_MAX_ENTRIES:
+        _foods_cache.clear()
+    _foods_cache[cache_key] = (time.time(), body, etag)
+
+    return _etag_response(request, body, etag, max_age=3600)
 
 @app.get("/categories", response_model=List[Category])
 async def list_categories(
@@ -555,25 +677,20 @@ async def list_categories(
     auth=Depends(require_api_key)
 ):
     """Get list of all food categories"""
-    try:
-        results = get_all_categories()
+    global _categories_cache
+    cached = _categories_cache
+    if cached and time.time() - cached[0] < CATEGORIES_CACHE_TTL:
+        return _etag_response(request, cached[1], cached[2], max_age=86400)
 
-        categories = []
-        for row in results:
-            # row format: id, name
-            category = Category(
-                id=row[0],
-                name=row[1]
-            )
-            categories.append(category)
+    results = await asyncio.to_thread(get_all_categories)
 
-        return categories
-
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error retrieving categories: {str(e)}"
-        )
+    # row format: id, name
+    payload = [
+        {"id": row[0], "name": row[1], "created_at": None} for row in results
+    ]
+    body, etag = _serialize_etag(payload)
+    _categories_cache = (time.time(), body, etag)
+    return _etag_response(request, body, etag, max_age=86400)
 
 # Additional endpoint for quick calorie lookup
 @app.get("/foods/search/{food_name}/calories")
@@ -584,31 +701,19 @@ async def get_food_calories(
     auth=Depends(require_api_key)
 ):
     """Quick endpoint to get just the calories for a specific food"""
-    try:
-        results = get_food_by_name(food_name)
-
-        if not results:
-            raise HTTPException(
-                status_code=404,
-                detail=f"No food found matching '{food_name}'"
-            )
+    results, _ = await _search_foods_cached(food_name)
 
-        # Return the first match with basic info
-        first_result = results[0]
-        return {
-            "food_name": first_result[1],
-            "calories_kcal": first_result[4],
-            "serving": first_result[2],
-            "total_matches": len(results)
-        }
+    if not results:
+        raise _NO_MATCHING_FOOD
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error getting food calories: {str(e)}"
-        )
+    # Return the first match with basic info
+    first_result = results[0]
+    return {
+        "food_name": first_result.name,
+        "calories_kcal": first_result.calories_kcal,
+        "serving": first_result.serving,
+        "total_matches": len(results)
+    }
 
 # API Key Management Endpoints (these don't require API key)
 @app.post("/api/create-test-user", tags=["Authentication"])
@@ -618,7 +723,7 @@ async def create_test_user():
     This endpoint is only for testing and should be removed in production.
     """
     try:
-        result = create_test_user_and_key()
+        result = await asyncio.to_thread(create_test_user_and_key)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -630,7 +735,9 @@ async def create_api_key(request: CreateApiKeyRequest):
     In production, this should be protected by proper authentication.
     """
     try:
-        result = create_api_key_for_user(request.user_id, request.name)
+        result = await asyncio.to_thread(
+            create_api_key_for_user, request.user_id, request.name
+        )
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -645,24 +752,26 @@ async def check_rate_limit_status(
     Check current rate limit status for your API key.
     """
     try:
-        # Get API key from header
-        api_key = request.headers.get("x-api-key")
-        if not api_key:
-            raise HTTPException(status_code=401, detail="API key required")
-
-        status = await get_rate_limit_status(api_key)
-
-        # Add rate limit headers to response
-        if hasattr(request.state, 'rate_limit_headers'):
-            for header, value in request.state.rate_limit_headers.items():
-                response.headers[header] = value
-
-        return status
+        # require_api_key already validated the key and returned its
+        # record, so the status check skips a second lookup
+        # The rate limit headers are attached by the middleware
+        return await get_rate_limit_status(auth)
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/refresh-cache", tags=["Maintenance"])
+async def refresh_cache():
+    """
+    Drop all in-process caches and rebuild the search index.
+    Call this after editing foods or categories so changes show up
+    before the TTLs expire.
+    """
+    reset_caches()
+    await asyncio.to_thread(search_index.load_index)
+    return {"message": "Caches cleared and search index reloaded"}
+
 @app.post("/api/cleanup-logs", tags=["Maintenance"])
 async def cleanup_logs(days_to_keep: int = 7):
     """
@@ -671,7 +780,7 @@ async def cleanup_logs(days_to_keep: int = 7):
     In production, this should be a scheduled job, not an API endpoint.
     """
     try:
-        deleted_count = cleanup_old_logs(days_to_keep)
+        deleted_count = await asyncio.to_thread(cleanup_old_logs, days_to_keep)
         return {
             "message": f"Cleaned up {deleted_count} old log entries",
             "days_kept": days_to_keep
@@ -683,12 +792,45 @@ async def cleanup_logs(days_to_keep: int = 7):
 @app.on_event("startup")
 async def startup_event():
     """Initialize the application"""
+    # Size the executor that to_thread/run_in_executor hand DB calls to;
+    # 32 workers keeps request concurrency from queueing behind the pool
+    # while still bounding the number of in-flight Turso round-trips
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=32, thread_name_prefix="db")
+    )
+
+    # Start the background flusher for batched writes and the hourly
+    # log cleanup so the logs table doesn't need on-demand pruning
+    asyncio.create_task(flush_writes_loop())
+    asyncio.create_task(cleanup_loop())
+    asyncio.create_task(known_hashes_loop())
+    asyncio.create_task(_health_probe_loop())
+    asyncio.create_task(search_index.refresh_loop())
+
     # Test database connection
-    if not test_connection():
+    if not await asyncio.to_thread(test_connection):
         print("WARNING: Database connection failed at startup")
     else:
         print("Database connection successful")
 
+        # Make sure the auth/rate-limit lookups have their indexes
+        await asyncio.to_thread(ensure_indexes)
+
+        # Warm the landing stats so the page's first fetch is served
+        # from memory instead of waiting on Turso
+        try:
+            await get_stats()
+        except Exception as e:
+            print(f"Stats warm-up failed: {str(e)}")
+
+        # Pre-fill the search cache with the documented example query,
+        # the first thing most new users try, and warm the category rows
+        try:
+            await _search_foods_cached("nasi lemak")
+            await asyncio.to_thread(get_all_categories)
+        except Exception as e:
+            print(f"Search warm-up failed: {str(e)}")
+
         # Optional: Create a test user on first run
         # Uncomment the following lines for development
         # try:
@@ -697,10 +839,31 @@ async def startup_event():
         # except Exception as e:
         #     print(f"Test user creation skipped: {str(e)}")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush buffered writes and release the shared database connection"""
+    # Drain the write-behind buffers (audit log rows, last_used_at
+    # updates) so a deploy restart doesn't drop the tail of the batch
+    await flush_pending_writes()
+    await asyncio.to_thread(close_connection)
+
+# Prefer libuv over the pure-Python selector loop when available
+try:
+    import uvloop
+    uvloop.install()
+except ImportError:
+    pass
+
 if __name__ == "__main__":
+    # Reload and worker count are mutually exclusive in uvicorn; opt in
+    # to reload explicitly for development, size workers via the
+    # platform-standard WEB_CONCURRENCY for production
     uvicorn.run(
         "app.main:app",
-        host="0.0.0.0",
-        port=8000,
-        reload=True
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", "8000")),
+        workers=int(os.getenv("WEB_CONCURRENCY", "0")) or None,
+        reload=os.getenv("RELOAD", "").lower() == "true",
+        loop="uvloop",
+        http="httptools"
     )
@@ -1,7 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import Optional
 from datetime import datetime
 
+# Response models are built from trusted DB rows (often via
+# model_construct), never mutated afterwards; frozen=True enforces that
+# and lets instances be shared safely between cached responses.
+_RESPONSE_CONFIG = ConfigDict(frozen=True, from_attributes=True)
+
 class CategoryBase(BaseModel):
     """Base category model"""
     id: int
@@ -10,8 +15,7 @@ class CategoryBase(BaseModel):
 
 class Category(CategoryBase):
     """Category response model"""
-    class Config:
-        from_attributes = True
+    model_config = _RESPONSE_CONFIG
 
 class FoodBase(BaseModel):
     """Base food model"""
@@ -27,21 +31,21 @@ class Food(FoodBase):
     """Food response model"""
     category_id: int
 
-    class Config:
-        from_attributes = True
+    model_config = _RESPONSE_CONFIG
 
 class FoodWithCategory(FoodBase):
     """Food response model with category information"""
     category: Optional[str] = None
 
-    class Config:
-        from_attributes = True
+    model_config = _RESPONSE_CONFIG
 
 class FoodSearchResponse(BaseModel):
     """Response model for food search results"""
     total: int
     foods: list[FoodWithCategory]
 
+    model_config = _RESPONSE_CONFIG
+
 class FoodListResponse(BaseModel):
     """Response model for paginated food list"""
     total: int
@@ -49,8 +53,12 @@ class FoodListResponse(BaseModel):
     per_page: int
     foods: list[FoodWithCategory]
 
+    model_config = _RESPONSE_CONFIG
+
 class HealthCheck(BaseModel):
     """Health check response model"""
     status: str
     message: str
     database_connected: bool
+
+    model_config = _RESPONSE_CONFIG
@@ -1,18 +1,75 @@
-from functools import wraps
+import asyncio
+import inspect
+import time
+from functools import lru_cache, wraps
 from typing import Optional
-from fastapi import Depends, HTTPException, Request, Response, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import APIKeyHeader
-from .auth import rate_limit_middleware, API_KEY_HEADER
+from .auth import (
+    rate_limit_middleware,
+    API_KEY_HEADER,
+    COUNTER_BUCKET_SECONDS,
+    RATE_LIMITS,
+    Usage
+)
+
+# One conditional-aggregate pass over the pre-aggregated counter
+# buckets: the minute and hour sums are subsets of the day range, so a
+# single scan of at most ~1440 rows answers all three windows (and
+# three Turso round-trips become one)
+_SQL_WINDOW_COUNTS = """
+SELECT
+  COALESCE(SUM((bucket >= ?) * count), 0) AS used_minute,
+  COALESCE(SUM((bucket >= ?) * count), 0) AS used_hour,
+  COALESCE(SUM(count), 0) AS used_day
+FROM rate_limit_counters
+WHERE api_key_id = ? AND bucket >= ?
+"""
+
+# Window lengths in counter buckets and limits frozen at import so the
+# per-call code iterates tuples instead of dict items
+_WINDOW_BUCKETS = tuple(
+    config["window"] // COUNTER_BUCKET_SECONDS for config in RATE_LIMITS.values()
+)
+_LIMITS = tuple(config["limit"] for config in RATE_LIMITS.values())
+
+def _db_usage(api_key_id: int) -> Usage:
+    """Sum window usage from the counter buckets (blocking; run in a thread)"""
+    from .database import get_database
+
+    conn = get_database()
+    cursor = conn.cursor()
+
+    # Minute-granular buckets make each window boundary at most one
+    # bucket coarse — acceptable for a fallback that only answers until
+    # the live counters have seen the key
+    now_bucket = int(time.time()) // COUNTER_BUCKET_SECONDS
+
+    cursor.execute(
+        _SQL_WINDOW_COUNTS,
+        [
+            now_bucket - _WINDOW_BUCKETS[0],
+            now_bucket - _WINDOW_BUCKETS[1],
+            api_key_id,
+            now_bucket - _WINDOW_BUCKETS[2]
+        ]
+    )
+    used = cursor.fetchone()
+    cursor.close()
+
+    return Usage(*used, *_LIMITS)
 
 # Dependency for rate limiting
 async def require_api_key(
     request: Request,
-    response: Response,
     api_key: Optional[str] = Depends(API_KEY_HEADER)
 ):
     """
     FastAPI dependency for API key authentication and rate limiting.
 
+    The rate limit headers it computes are attached to the response by
+    RateLimitHeadersMiddleware, not copied here.
+
     Usage:
         @app.get("/protected")
         async def protected_endpoint(auth=Depends(require_api_key)):
@@ -21,40 +78,40 @@ async def require_api_key(
     # Call the rate limit middleware
     await rate_limit_middleware(request, api_key)
 
-    # Add rate limit headers to response
-    if hasattr(request.state, 'rate_limit_headers'):
-        for header, value in request.state.rate_limit_headers.items():
-            response.headers[header] = value
-
-    # Return user information for use in endpoint
-    return request.state.user if hasattr(request.state, 'user') else None
+    # Return user information for use in endpoint; plain dict get on the
+    # scope state, no hasattr probe through the State wrapper
+    return request.scope.get("state", {}).get("user")
 
 # Optional: Decorator for rate limiting (alternative approach)
 def rate_limited(func):
     """
     Decorator for rate limiting endpoints.
 
+    The positions of the `request` and `api_key` parameters are resolved
+    from the signature once here, so each call indexes into args instead
+    of scanning them with isinstance checks.
+
     Usage:
         @app.get("/protected")
         @rate_limited
         async def protected_endpoint(request: Request, api_key: str = Depends(API_KEY_HEADER)):
             return {"message": "Protected content"}
     """
+    params = list(inspect.signature(func).parameters)
+    req_idx = params.index('request') if 'request' in params else None
+    key_idx = params.index('api_key') if 'api_key' in params else None
+
     @wraps(func)
     async def wrapper(*args, **kwargs):
-        # Extract request and api_key from kwargs
-        request = None
-        api_key = None
-
-        for arg in args:
-            if isinstance(arg, Request):
-                request = arg
-                break
-
-        if not request:
+        if req_idx is not None and req_idx < len(args):
+            request = args[req_idx]
+        else:
             request = kwargs.get('request')
 
-        api_key = kwargs.get('api_key')
+        if key_idx is not None and key_idx < len(args):
+            api_key = args[key_idx]
+        else:
+            api_key = kwargs.get('api_key')
 
         if not request or not api_key:
             raise HTTPException(
@@ -70,73 +127,89 @@ def rate_limited(func):
 
     return wrapper
 
+# The same half-dozen header names repeat on every response, and the
+# values (limits and remaining counts) cycle through a few hundred small
+# integers, so both encodings are memoized instead of re-done per send
+@lru_cache(maxsize=64)
+def _header_name_bytes(name: str) -> bytes:
+    return name.lower().encode("latin-1")
+
+@lru_cache(maxsize=4096)
+def _header_value_bytes(value: str) -> bytes:
+    return value.encode("latin-1")
+
+# Only these routes depend on require_api_key and so can have headers
+# stashed in scope state; everything else (landing page, health, stats,
+# docs, static assets, admin endpoints) skips the send wrapper entirely
+_RATE_LIMITED_PREFIXES = ("/foods", "/categories")
+_RATE_LIMITED_PATHS = frozenset({"/api/rate-limit-status"})
+
 # Middleware for adding rate limit headers to all responses
-async def add_rate_limit_headers(request: Request, call_next):
+class RateLimitHeadersMiddleware:
     """
-    Middleware to add rate limit headers to responses.
-    Should be added to FastAPI app:
+    Pure ASGI middleware that injects the rate limit headers stashed in
+    scope state by `rate_limit_middleware` into the response start
+    message. Written against the raw ASGI interface rather than
+    BaseHTTPMiddleware, which buffers every response through a task
+    group and memory stream just to edit headers.
 
-    app.add_middleware(add_rate_limit_headers)
+    app.add_middleware(RateLimitHeadersMiddleware)
     """
-    response = await call_next(request)
 
-    # Add rate limit headers if they exist in request state
-    if hasattr(request.state, 'rate_limit_headers'):
-        for header, value in request.state.rate_limit_headers.items():
-            response.headers[header] = value
-
-    return response
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        # Fast path for routes that never rate limit: hand the original
+        # send straight through instead of paying a wrapper closure and
+        # an extra dict lookup per response message
+        path = scope["path"]
+        if not (path.startswith(_RATE_LIMITED_PREFIXES) or path in _RATE_LIMITED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = scope.get("state", {}).get("rate_limit_headers")
+                if headers:
+                    message["headers"].extend(
+                        (_header_name_bytes(name), _header_value_bytes(value))
+                        for name, value in headers.items()
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
 # Helper function to get current rate limit status
-async def get_rate_limit_status(api_key: str) -> dict:
+async def get_rate_limit_status(api_key_info: dict) -> dict:
     """
-    Get current rate limit status for an API key.
+    Get current rate limit status for an already-validated API key.
+
+    The caller passes the record resolved by `require_api_key`, so the
+    key is not re-validated (and the DB not re-queried) here.
 
     Returns:
         dict: Current usage and limits for all time windows
     """
-    from .auth import validate_api_key, check_rate_limit
-
-    # Validate API key
-    api_key_info = validate_api_key(api_key)
-    if not api_key_info:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid API key"
-        )
-
     # Check rate limits without logging
     try:
-        # We'll check the rate limit without actually logging a request
-        # This is a read-only operation
-        from .database import get_database
-        from datetime import datetime, timedelta
-        from .auth import RATE_LIMITS
-
-        conn = get_database()
-        cursor = conn.cursor()
-
-        current_time = datetime.now()
-        usage = {}
-
-        for period, config in RATE_LIMITS.items():
-            window_start = current_time - timedelta(seconds=config["window"])
-
-            cursor.execute("""
-                SELECT COUNT(*) FROM rate_limit_logs
-                WHERE api_key_id = ?
-                AND timestamp > ?
-                AND timestamp <= ?
-            """, [api_key_info["api_key_id"], window_start.isoformat(), current_time.isoformat()])
-
-            count = cursor.fetchone()[0]
-            usage[f"used_{period}"] = count
-            usage[f"limit_{period}"] = config["limit"]
-            usage[f"remaining_{period}"] = max(0, config["limit"] - count)
-
-        cursor.close()
-        conn.close()
+        from .auth import get_usage
+
+        # The live counters (Redis or in-memory) answer without touching
+        # the DB; the audit log is only consulted when this process has
+        # not seen the key yet (e.g. right after a restart)
+        counts = await get_usage(api_key_info["api_key_id"])
+        if counts is None:
+            counts = await asyncio.to_thread(
+                _db_usage, api_key_info["api_key_id"]
+            )
 
+        # Build the response straight from the named fields — no
+        # intermediate dict with formatted keys
         return {
             "status": "active",
             "user": {
@@ -145,19 +218,19 @@ async def get_rate_limit_status(api_key: str) -> dict:
             },
             "limits": {
                 "per_minute": {
-                    "limit": usage["limit_minute"],
-                    "used": usage["used_minute"],
-                    "remaining": usage["remaining_minute"]
+                    "limit": counts.limit_minute,
+                    "used": counts.used_minute,
+                    "remaining": max(0, counts.limit_minute - counts.used_minute)
                 },
                 "per_hour": {
-                    "limit": usage["limit_hour"],
-                    "used": usage["used_hour"],
-                    "remaining": usage["remaining_hour"]
+                    "limit": counts.limit_hour,
+                    "used": counts.used_hour,
+                    "remaining": max(0, counts.limit_hour - counts.used_hour)
                 },
                 "per_day": {
-                    "limit": usage["limit_day"],
-                    "used": usage["used_day"],
-                    "remaining": usage["remaining_day"]
+                    "limit": counts.limit_day,
+                    "used": counts.used_day,
+                    "remaining": max(0, counts.limit_day - counts.used_day)
                 }
             }
         }
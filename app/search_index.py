@@ -0,0 +1,93 @@
+"""In-process trigram index over food names.
+
+The search endpoint used to back every query onto a `LIKE %name%` full
+scan in Turso. The id->name map is small enough to hold in memory, so
+the substring filtering happens here and the database is only asked for
+the matching rows by id. A background task reloads the index so renames
+and inserts show up within a few minutes.
+"""
+
+import asyncio
+import time
+
+from .database import _execute
+
+# How often the background task reloads the name map from Turso
+REFRESH_INTERVAL = 600
+
+_SQL_ID_NAMES = "SELECT id, name FROM foods"
+
+# (loaded_at, {id: casefolded name}, {trigram: set of ids}); None until
+# the first load succeeds, and lookups fall back to the LIKE query until
+# then. Names are casefolded in Python, not with SQLite lower(), so the
+# normalization matches what the handlers apply to queries beyond ASCII.
+_index = None
+
+
+def _trigrams(text):
+    """All overlapping 3-grams of a casefolded string"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def load_index():
+    """Fetch id/name pairs and rebuild the trigram postings (blocking)"""
+    global _index
+    try:
+        cursor = _execute(_SQL_ID_NAMES)
+        rows = cursor.fetchall()
+        cursor.close()
+
+        names = {row[0]: row[1].casefold() for row in rows}
+        postings = {}
+        for food_id, name in names.items():
+            for gram in _trigrams(name):
+                postings.setdefault(gram, set()).add(food_id)
+
+        _index = (time.time(), names, postings)
+        return True
+    except Exception as e:
+        print(f"Search index load failed: {str(e)}")
+        return False
+
+
+def lookup(query):
+    """Ids of foods whose name contains `query`, best matches first.
+
+    Returns None when the index has not loaded yet so the caller can
+    fall back to the LIKE query.
+    """
+    if _index is None:
+        return None
+    _, names, postings = _index
+
+    grams = _trigrams(query)
+    if grams:
+        # Intersect the posting lists, rarest gram first so the working
+        # set shrinks as fast as possible
+        lists = sorted((postings.get(gram, set()) for gram in grams), key=len)
+        candidates = set(lists[0])
+        for posting in lists[1:]:
+            candidates &= posting
+            if not candidates:
+                return []
+    else:
+        # Two-character queries have no trigrams; scanning the in-memory
+        # names is still far cheaper than a LIKE scan at the database
+        candidates = names.keys()
+
+    # Trigram overlap admits false positives, so confirm the substring
+    # and rank earlier matches within the name first
+    matches = []
+    for food_id in candidates:
+        pos = names[food_id].find(query)
+        if pos >= 0:
+            matches.append((pos, food_id))
+    matches.sort()
+    return [food_id for _, food_id in matches]
+
+
+async def refresh_loop():
+    """Load the index at startup, then rebuild it every few minutes"""
+    while True:
+        await asyncio.to_thread(load_index)
+        await asyncio.sleep(REFRESH_INTERVAL)
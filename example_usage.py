@@ -9,7 +9,7 @@ This script demonstrates:
 4. Checking rate limit status
 """
 
-import requests
+import httpx
 import json
 import time
 from typing import Optional
@@ -17,6 +17,24 @@ from typing import Optional
 # Base URL of the API (change this to your deployed URL)
 BASE_URL = "http://localhost:8000"
 
+# Rate limit headers the API sets, paired with display labels; built
+# once here instead of on every response we inspect
+RATE_LIMIT_HEADER_LABELS = (
+    ('X-RateLimit-Limit-Minute', 'Limit per minute'),
+    ('X-RateLimit-Remaining-Minute', 'Remaining this minute'),
+    ('X-RateLimit-Limit-Hour', 'Limit per hour'),
+    ('X-RateLimit-Remaining-Hour', 'Remaining this hour'),
+    ('X-RateLimit-Limit-Day', 'Limit per day'),
+    ('X-RateLimit-Remaining-Day', 'Remaining today')
+)
+
+# (period, limit header, used header) triples for the 429 report
+RATE_LIMIT_PERIOD_HEADERS = (
+    ('minute', 'X-RateLimit-Limit-Minute', 'X-RateLimit-Used-Minute'),
+    ('hour', 'X-RateLimit-Limit-Hour', 'X-RateLimit-Used-Hour'),
+    ('day', 'X-RateLimit-Limit-Day', 'X-RateLimit-Used-Day')
+)
+
 class KaloriMakananAPI:
     def __init__(self, api_key: Optional[str] = None):
         self.base_url = BASE_URL
@@ -24,10 +42,17 @@ class KaloriMakananAPI:
         self.headers = {}
         if api_key:
             self.headers["X-API-Key"] = api_key
+        # One pooled client for the whole demo: the TCP connection is
+        # reused across requests instead of re-established per call
+        self.client = httpx.Client(base_url=self.base_url, headers=self.headers)
+
+    def close(self):
+        """Close the pooled HTTP client"""
+        self.client.close()
 
     def create_test_user(self):
         """Create a test user and get API key"""
-        response = requests.post(f"{self.base_url}/api/create-test-user")
+        response = self.client.post("/api/create-test-user")
         if response.status_code == 200:
             data = response.json()
             print(f"✅ Test user created successfully!")
@@ -40,10 +65,7 @@ class KaloriMakananAPI:
 
     def check_rate_limit_status(self):
         """Check current rate limit status"""
-        response = requests.get(
-            f"{self.base_url}/api/rate-limit-status",
-            headers=self.headers
-        )
+        response = self.client.get("/api/rate-limit-status")
 
         if response.status_code == 200:
             data = response.json()
@@ -63,11 +85,7 @@ class KaloriMakananAPI:
 
     def search_foods(self, query: str):
         """Search for foods by name"""
-        response = requests.get(
-            f"{self.base_url}/foods/search",
-            params={"name": query},
-            headers=self.headers
-        )
+        response = self.client.get("/foods/search", params={"name": query})
 
         if response.status_code == 200:
             data = response.json()
@@ -100,10 +118,7 @@ class KaloriMakananAPI:
 
     def get_food_detail(self, food_id: int):
         """Get detailed information about a specific food"""
-        response = requests.get(
-            f"{self.base_url}/foods/{food_id}",
-            headers=self.headers
-        )
+        response = self.client.get(f"/foods/{food_id}")
 
         if response.status_code == 200:
             food = response.json()
@@ -123,10 +138,7 @@ class KaloriMakananAPI:
 
     def list_categories(self):
         """Get list of all food categories"""
-        response = requests.get(
-            f"{self.base_url}/categories",
-            headers=self.headers
-        )
+        response = self.client.get("/categories")
 
         if response.status_code == 200:
             categories = response.json()
@@ -150,11 +162,7 @@ class KaloriMakananAPI:
 
         request_count = 0
         while request_count < 15:  # Try to exceed the per-minute limit
-            response = requests.get(
-                f"{self.base_url}/foods/search",
-                params={"name": "test"},
-                headers=self.headers
-            )
+            response = self.client.get("/foods/search", params={"name": "test"})
 
             request_count += 1
 
@@ -175,16 +183,7 @@ class KaloriMakananAPI:
     def _print_rate_limit_headers(self, response):
         """Print rate limit headers from response"""
         print("\n📈 Rate Limit Info:")
-        headers_to_check = [
-            ('X-RateLimit-Limit-Minute', 'Limit per minute'),
-            ('X-RateLimit-Remaining-Minute', 'Remaining this minute'),
-            ('X-RateLimit-Limit-Hour', 'Limit per hour'),
-            ('X-RateLimit-Remaining-Hour', 'Remaining this hour'),
-            ('X-RateLimit-Limit-Day', 'Limit per day'),
-            ('X-RateLimit-Remaining-Day', 'Remaining today')
-        ]
-
-        for header, label in headers_to_check:
+        for header, label in RATE_LIMIT_HEADER_LABELS:
             value = response.headers.get(header)
             if value:
                 print(f"  {label}: {value}")
@@ -196,10 +195,7 @@ class KaloriMakananAPI:
 
         # Print which limits were exceeded
         print("\n  Limits exceeded:")
-        for period in ['minute', 'hour', 'day']:
-            limit_header = f'X-RateLimit-Limit-{period.capitalize()}'
-            used_header = f'X-RateLimit-Used-{period.capitalize()}'
-
+        for period, limit_header, used_header in RATE_LIMIT_PERIOD_HEADERS:
             limit = response.headers.get(limit_header)
             used = response.headers.get(used_header)
 
@@ -222,6 +218,7 @@ def main():
         return
 
     # Create authenticated client
+    api.close()
     api = KaloriMakananAPI(api_key)
 
     # Step 2: Check initial rate limit status
@@ -250,6 +247,8 @@ def main():
     if choice == 'y':
         api.demonstrate_rate_limiting()
 
+    api.close()
+
     print("\n✅ Demo completed!")
     print(f"\n💡 Your API key: {api_key}")
     print("Save this key to use in your applications!")
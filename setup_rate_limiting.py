@@ -19,10 +19,9 @@ from app.auth import create_test_user_and_key
 # Load environment variables
 load_dotenv()
 
-def create_tables():
+def create_tables(conn):
     """Create all necessary tables for rate limiting"""
 
-    conn = get_database()
     cursor = conn.cursor()
 
     try:
@@ -62,9 +61,9 @@ def create_tables():
         """)
         print("✅ API keys table created")
 
-        # Create index on key_hash
+        # Create index on key_hash (unique, matching ensure_indexes)
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_api_keys_key_hash ON api_keys(key_hash)
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_api_keys_key_hash ON api_keys(key_hash)
         """)
         print("✅ API keys index created")
 
@@ -74,21 +73,46 @@ def create_tables():
             CREATE TABLE IF NOT EXISTS rate_limit_logs (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 api_key_id INTEGER NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                timestamp INTEGER NOT NULL DEFAULT (CAST(strftime('%s', 'now') AS INTEGER) * 1000),
                 endpoint TEXT,
                 FOREIGN KEY (api_key_id) REFERENCES api_keys(id) ON DELETE CASCADE
             )
         """)
         print("✅ Rate limit logs table created")
 
-        # Create composite index for efficient queries
+        # Create composite index for efficient queries. Newest entries
+        # first, matching the "recent window" predicates of the rate
+        # limit counts and the recency-ordered cleanup scans.
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_rate_limit_logs_api_key_timestamp
-            ON rate_limit_logs(api_key_id, timestamp)
+            ON rate_limit_logs(api_key_id, timestamp DESC)
         """)
         print("✅ Rate limit logs index created")
 
-        # Commit all changes
+        # Timestamp-only index used by the cleanup delete
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_rate_limit_logs_timestamp
+            ON rate_limit_logs(timestamp)
+        """)
+        print("✅ Rate limit logs timestamp index created")
+
+        # Create rate_limit_counters table: one pre-aggregated row per
+        # (key, minute) upserted by the log flusher. WITHOUT ROWID
+        # clusters rows on the primary key so window sums are a single
+        # contiguous range scan.
+        print("\nCreating rate_limit_counters table...")
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limit_counters (
+                api_key_id INTEGER NOT NULL,
+                bucket INTEGER NOT NULL,
+                count INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (api_key_id, bucket)
+            ) WITHOUT ROWID
+        """)
+        print("✅ Rate limit counters table created")
+
+        # Commit all changes in one transaction: a single remote round-trip
+        # finalizes every statement above
         conn.commit()
         print("\n✅ All tables created successfully!")
 
@@ -98,17 +122,15 @@ def create_tables():
         raise
     finally:
         cursor.close()
-        conn.close()
 
-def check_existing_tables():
+def check_existing_tables(conn):
     """Check which tables already exist"""
-    conn = get_database()
     cursor = conn.cursor()
 
     try:
         cursor.execute("""
             SELECT name FROM sqlite_master
-            WHERE type='table' AND name IN ('users', 'api_keys', 'rate_limit_logs')
+            WHERE type='table' AND name IN ('users', 'api_keys', 'rate_limit_logs', 'rate_limit_counters')
             ORDER BY name
         """)
 
@@ -123,15 +145,13 @@ def check_existing_tables():
 
     finally:
         cursor.close()
-        conn.close()
 
-def verify_setup():
+def verify_setup(conn):
     """Verify the setup by checking table schemas"""
-    conn = get_database()
     cursor = conn.cursor()
 
     try:
-        tables = ['users', 'api_keys', 'rate_limit_logs']
+        tables = ['users', 'api_keys', 'rate_limit_logs', 'rate_limit_counters']
 
         print("\n🔍 Verifying table schemas:")
         for table in tables:
@@ -152,7 +172,6 @@ def verify_setup():
 
     finally:
         cursor.close()
-        conn.close()
 
 def main():
     """Main setup function"""
@@ -163,7 +182,6 @@ def main():
     print("\n1️⃣ Checking database connection...")
     try:
         conn = get_database()
-        conn.close()
         print("✅ Database connection successful")
     except Exception as e:
         print(f"❌ Database connection failed: {str(e)}")
@@ -172,21 +190,23 @@ def main():
         print("  TURSO_DATABASE_TOKEN=your_database_token")
         return
 
+    # The helpers share the one connection opened above; get_database()
+    # holds a process-wide singleton, so no further handshakes occur
     # Check existing tables
     print("\n2️⃣ Checking existing tables...")
-    existing_tables = check_existing_tables()
+    existing_tables = check_existing_tables(conn)
 
     # Create tables
     print("\n3️⃣ Creating rate limiting tables...")
     try:
-        create_tables()
+        create_tables(conn)
     except Exception as e:
         print(f"\n❌ Setup failed: {str(e)}")
         return
 
     # Verify setup
     print("\n4️⃣ Verifying setup...")
-    verify_setup()
+    verify_setup(conn)
 
     # Ask if user wants to create test user
     print("\n5️⃣ Would you like to create a test user and API key? (y/n)")